@@ -1,105 +1,376 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import sqlite3
-import pandas as pd
+from flask import (Flask, Blueprint, g, render_template, request, jsonify, send_file, Response,
+                   stream_with_context, url_for)
 from datetime import datetime
+from functools import wraps
+import argparse
+import itertools
 import os
+import threading
+import metrics
+from cache import ResponseCache, CachedResponse
+from database import (ConnectionPool, BookRepository, BATCH_CHUNK_SIZE, ChangesExpired,
+                      DuplicateName, DEFAULT_CHANGES_LIMIT, DEFAULT_PAGE_SIZE, DEFAULT_SEARCH_LIMIT,
+                      EXPORT_BATCH_SIZE, MAX_PAGE_SIZE, book_to_dict, get_db_path, parse_book,
+                      parse_filters, parse_operations)
+from export import EXPORT_FORMATS
+from importer import IMPORT_BATCH_SIZE, IMPORT_MODES, import_file
+from jobs import ImportJobManager
+from registry import DEFAULT_COLLECTION, CollectionRegistry, fan_out
+from stats import (DEFAULT_BINS, DEFAULT_TOP, GROUP_BY, MAX_BINS, MAX_TOP, StatsSnapshot,
+                   collection_stats)
 
 app = Flask(__name__)
+app.config['DATABASE'] = get_db_path()
+app.config['UPLOAD_DIR'] = os.environ.get('LIVROS_UPLOAD_DIR', 'uploads')
 
-def init_db():
-    conn = sqlite3.connect('livros.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS livros (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            num_livros INTEGER,
-            valor_euros REAL,
-            livros_faltantes INTEGER,
-            total_livros INTEGER,
-            preco_medio REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+# Request timing / profiling hooks, only when LIVROS_METRICS or
+# LIVROS_PROFILE_DIR is set (see also --metrics and --profile below)
+metrics.instrument_app(app)
+
+# Every /api route is served for the default collection under /api and
+# for any collection under /api/collections/<collection>; see the end of
+# the file
+api = Blueprint('api', __name__)
+
+class Collection:
+    """One collection file and the state the API keeps for it."""
+
+    def __init__(self, name, db_path, upload_dir):
+        self.name = name
+        # One pooled repository per process; connections are reused per thread
+        self.repository = BookRepository(ConnectionPool(db_path))
+        # Read responses are cached until the next write to the database
+        self.response_cache = ResponseCache()
+        # Columnar copy of livros for /api/stats, reloaded when the data changes
+        self.stats_snapshot = StatsSnapshot()
+        self.import_jobs = ImportJobManager(self.repository, upload_dir,
+                                            on_change=self.response_cache.bump)
+
+    def init(self, recover=True):
+        self.repository.init_schema()
+        self.import_jobs.init_schema()
+        # Pick up imports interrupted by a restart; with several worker
+        # processes only one of them may do this
+        if recover:
+            self.import_jobs.recover()
+            # Old tombstones in the change log, see /api/books/changes
+            self.repository.compact_changes()
+
+    def close(self):
+        # Running imports stop at a batch boundary and resume on the next start
+        self.import_jobs.shutdown()
+        self.repository.pool.close_all()
+
+registry = CollectionRegistry(app.config['DATABASE'])
+
+# Collections opened by this process, by name
+collections = {}
+collections_lock = threading.Lock()
+
+# Responses of the cross-collection routes, dropped when any collection changes
+fanout_cache = ResponseCache()
+
+def _new_collection(name, db_path):
+    # The default collection keeps the upload directory it always had
+    upload_dir = app.config['UPLOAD_DIR']
+    if name != DEFAULT_COLLECTION:
+        upload_dir = os.path.join(upload_dir, name)
+    return Collection(name, db_path, upload_dir)
+
+default_collection = _new_collection(DEFAULT_COLLECTION, app.config['DATABASE'])
+collections[DEFAULT_COLLECTION] = default_collection
+
+def get_collection(name):
+    """The open Collection called name, opening it on first use; None if
+    there is no such collection."""
+    collection = collections.get(name)
+    if collection is not None:
+        return collection
+    db_path = registry.path(name)
+    if db_path is None:
+        return None
+    with collections_lock:
+        collection = collections.get(name)
+        if collection is None:
+            collection = _new_collection(name, db_path)
+            # Created after start-up (or by another process): nothing to recover
+            collection.init(recover=False)
+            collections[name] = collection
+    return collection
+
+def all_collections():
+    return [collection for collection in map(get_collection, registry.names())
+            if collection is not None]
+
+def cache_stats():
+    caches = [collection.response_cache for collection in list(collections.values())]
+    totals = {}
+    for cache in caches + [fanout_cache]:
+        for key, value in cache.stats().items():
+            totals[(key,)] = totals.get((key,), 0) + value
+    return totals
+
+metrics.Gauge('livros_response_cache', 'Estado da cache de respostas', ('stat',),
+              collect=cache_stats)
+
+def configure_database(db_path):
+    """Point the default collection at another file; closes every open one."""
+    global default_collection
+    for collection in list(collections.values()):
+        collection.close()
+    collections.clear()
+    app.config['DATABASE'] = db_path
+    registry.default_path = db_path
+    default_collection = _new_collection(DEFAULT_COLLECTION, db_path)
+    collections[DEFAULT_COLLECTION] = default_collection
+    fanout_cache.bump()
+    return default_collection.repository
+
+def _request_cache():
+    # (cache, change token) for the current request
+    collection = g.get('collection')
+    if collection is not None:
+        repository = collection.repository
+        return collection.response_cache, (id(repository), repository.data_version())
+    return fanout_cache, tuple((c.name, id(c.repository), c.repository.data_version())
+                               for c in all_collections())
+
+def cached(view):
+    """Serve a GET endpoint from the response cache, with ETag / 304 support."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        # Commits from other processes don't go through response_cache.bump()
+        response_cache, token = _request_cache()
+        response_cache.observe(token)
+        entry = response_cache.get(key)
+        hit = entry is not None
+        if not hit:
+            version = response_cache.version
+            response = app.make_response(view(*args, **kwargs))
+            # Errors are cheap to recompute and are never cached
+            if response.status_code != 200:
+                return response
+            entry = CachedResponse(response.get_data(), response.mimetype)
+            response_cache.put(key, version, entry)
+        
+        response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        # Clients must revalidate, which costs a 304 while nothing changed
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response.make_conditional(request)
+    return wrapper
+
+def init_db(recover=True):
+    # Every collection is opened up front, so with recover only this
+    # process resumes their interrupted imports
+    for name, db_path in registry.paths().items():
+        with collections_lock:
+            collection = collections.get(name)
+            if collection is None:
+                collection = collections[name] = _new_collection(name, db_path)
+        collection.init(recover)
+
+def shutdown():
+    for collection in list(collections.values()):
+        collection.close()
+
+@api.url_value_preprocessor
+def pull_collection(endpoint, values):
+    name = values.pop('collection', DEFAULT_COLLECTION) if values else DEFAULT_COLLECTION
+    g.collection = get_collection(name)
+
+@api.url_defaults
+def add_collection(endpoint, values):
+    # url_for() inside a collection's routes stays in that collection
+    collection = g.get('collection')
+    if collection is not None and 'collection' not in values \
+            and app.url_map.is_endpoint_expecting(endpoint, 'collection'):
+        values['collection'] = collection.name
 
-@app.route('/api/books', methods=['GET'])
+@api.before_request
+def require_collection():
+    if g.collection is None:
+        return jsonify({'error': 'Coleção não encontrada'}), 404
+
+PAGINATION_PARAMS = ('limit', 'cursor', 'sort', 'fields')
+
+@api.route('/books', methods=['GET'])
+@cached
 def get_books():
-    conn = sqlite3.connect('livros.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM livros")
-    books = cursor.fetchall()
-    conn.close()
-    
-    return jsonify([{
-        'id': book[0],
-        'nome': book[1],
-        'num_livros': book[2],
-        'valor_euros': book[3],
-        'livros_faltantes': book[4],
-        'total_livros': book[5],
-        'preco_medio': book[6]
-    } for book in books])
-
-@app.route('/api/books', methods=['POST'])
-def add_book():
-    data = request.json
-    conn = sqlite3.connect('livros.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO livros (nome, num_livros, valor_euros, livros_faltantes,
-                          total_livros, preco_medio)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        data['nome'],
-        data['num_livros'],
-        data['valor_euros'],
-        data['livros_faltantes'],
-        data['total_livros'],
-        data['preco_medio']
-    ))
+    collection = g.collection
+    # Typed numeric filters: <column>=, <column>_min=, <column>_max=
+    try:
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Without pagination parameters keep returning the plain list
+    if not any(param in request.args for param in PAGINATION_PARAMS):
+        books = collection.repository.list_books(filters)
+        return jsonify([book_to_dict(book) for book in books])
+    
+    sort = request.args.get('sort', 'id')
+    descending = sort.startswith('-')
+    fields = request.args.get('fields')
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        books, next_cursor = collection.repository.list_page(
+            limit=limit,
+            cursor=request.args.get('cursor'),
+            sort=sort.lstrip('-'),
+            descending=descending,
+            fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+            filters=filters
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'books': books, 'next_cursor': next_cursor})
+
+@api.route('/books/export', methods=['GET'])
+def export_books():
+    collection = g.collection
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Formato inválido: {export_format}'}), 400
     
-    conn.commit()
-    conn.close()
+    try:
+        batch_size = int(request.args.get('batch_size', EXPORT_BATCH_SIZE))
+    except ValueError:
+        return jsonify({'error': 'batch_size inválido'}), 400
+    
+    encoder, mimetype, extension = EXPORT_FORMATS[export_format]
+    batches = collection.repository.iter_batches(max(1, batch_size))
+    return Response(
+        stream_with_context(encoder(batches)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={collection.name}.{extension}'}
+    )
+
+@api.route('/books/search', methods=['GET'])
+@cached
+def search_books():
+    collection = g.collection
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q obrigatório'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit inválido'}), 400
+    
+    books = collection.repository.search_names(query, limit)
+    return jsonify([book_to_dict(book) for book in books])
+
+@api.route('/books/changes', methods=['GET'])
+@cached
+def get_changes():
+    collection = g.collection
+    # Delta sync: everything changed after the client's last version
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', DEFAULT_CHANGES_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'since e limit devem ser inteiros'}), 400
+    try:
+        changes, version, has_more = collection.repository.changes_since(since, limit)
+    except ChangesExpired:
+        # Tombstones the client needs are gone; it must sync again from 0
+        return jsonify({'error': 'Versão expirada, sincronize a coleção completa com since=0',
+                        'version': collection.repository.changes_version()}), 410
+    return jsonify({
+        'changes': [
+            {'version': change_version, 'id': book_id, 'deleted': book is None,
+             'book': book_to_dict(book) if book else None}
+            for change_version, book_id, book in changes
+        ],
+        'version': version,
+        'has_more': has_more,
+    })
+
+@api.route('/books', methods=['POST'])
+def add_book():
+    collection = g.collection
+    # total_livros and preco_medio are computed by the database
+    try:
+        values = parse_book(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        collection.repository.add_book(values)
+    except DuplicateName as e:
+        return jsonify({'error': str(e)}), 409
+    collection.response_cache.bump()
     return jsonify({'message': 'Livro adicionado com sucesso!'})
 
-@app.route('/api/books/<int:book_id>', methods=['PUT'])
+@api.route('/books/<int:book_id>', methods=['PUT'])
 def update_book(book_id):
-    data = request.json
-    conn = sqlite3.connect('livros.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE livros
-        SET nome=?, num_livros=?, valor_euros=?, livros_faltantes=?,
-            total_livros=?, preco_medio=?
-        WHERE id=?
-    ''', (
-        data['nome'],
-        data['num_livros'],
-        data['valor_euros'],
-        data['livros_faltantes'],
-        data['total_livros'],
-        data['preco_medio'],
-        book_id
-    ))
-    
-    conn.commit()
-    conn.close()
+    collection = g.collection
+    try:
+        values = parse_book(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        collection.repository.update_book(book_id, values)
+    except DuplicateName as e:
+        return jsonify({'error': str(e)}), 409
+    collection.response_cache.bump()
     return jsonify({'message': 'Livro atualizado com sucesso!'})
 
-@app.route('/api/books/<int:book_id>', methods=['DELETE'])
+@api.route('/books/<int:book_id>', methods=['DELETE'])
 def delete_book(book_id):
-    conn = sqlite3.connect('livros.db')
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM livros WHERE id=?", (book_id,))
-    conn.commit()
-    conn.close()
+    collection = g.collection
+    collection.repository.delete_book(book_id)
+    collection.response_cache.bump()
     return jsonify({'message': 'Livro excluído com sucesso!'})
 
-@app.route('/api/books/import', methods=['POST'])
+@api.route('/books/batch', methods=['POST'])
+def batch_books():
+    collection = g.collection
+    data = request.get_json(silent=True)
+    items = data.get('operations') if isinstance(data, dict) else data
+    try:
+        chunk_size = int(request.args.get('chunk_size', BATCH_CHUNK_SIZE))
+        operations, errors = parse_operations(items)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Nothing is applied unless every operation is valid
+    if errors:
+        return jsonify({'error': 'Operações inválidas', 'errors': errors}), 400
+    
+    # Very large batches commit in chunks so one transaction never holds
+    # the write lock for too long
+    results = []
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(operations), chunk_size):
+        chunk = operations[start:start + chunk_size]
+        try:
+            applied = collection.repository.apply_operations(chunk)
+        except DuplicateName as e:
+            return jsonify({
+                'error': f'Erro ao aplicar lote: {str(e)}',
+                'applied': len(results),
+                'results': results
+            }), 409
+        except Exception as e:
+            return jsonify({
+                'error': f'Erro ao aplicar lote: {str(e)}',
+                'applied': len(results),
+                'results': results
+            }), 500
+        for offset, ((kind, _, _), (book_id, status)) in enumerate(zip(chunk, applied)):
+            results.append({'index': start + offset, 'op': kind, 'id': book_id,
+                            'status': status})
+        collection.response_cache.bump()
+    
+    return jsonify({'applied': len(results), 'results': results})
+
+@api.route('/books/import', methods=['POST'])
 def import_excel():
+    collection = g.collection
     if 'file' not in request.files:
         return jsonify({'error': 'Nenhum arquivo enviado'}), 400
     
@@ -108,54 +379,66 @@ def import_excel():
         return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
     
     try:
-        df = pd.read_excel(file)
-        conn = sqlite3.connect('livros.db')
-        cursor = conn.cursor()
-        
-        for _, row in df.iterrows():
-            try:
-                values = (
-                    str(row.get('NOME', '')),
-                    int(float(row.get('Nº LIVROS', 0))),
-                    float(row.get('VALOR(€)', 0.0)),
-                    int(float(row.get('LIVROS EM FALTA', 0))),
-                    int(float(row.get('TOTAL LIVROS', 0))),
-                    float(row.get('PREÇO MÉDIO(€)', 0.0))
-                )
-                
-                cursor.execute('''
-                    INSERT INTO livros (
-                        nome, num_livros, valor_euros, livros_faltantes,
-                        total_livros, preco_medio
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                ''', values)
-            except Exception as e:
-                print(f"Erro ao processar linha: {str(e)}")
-                continue
-        
-        conn.commit()
-        conn.close()
-        return jsonify({'message': f'Importados {len(df)} registros com sucesso!'})
+        batch_size = max(1, int(request.form.get('batch_size', IMPORT_BATCH_SIZE)))
+    except ValueError:
+        return jsonify({'error': 'batch_size inválido'}), 400
+    
+    # mode=upsert updates books already stored under the same name instead
+    # of rejecting them; delete_missing=1 also deletes the books not in the file
+    mode = request.args.get('mode') or request.form.get('mode') or 'append'
+    if mode not in IMPORT_MODES:
+        return jsonify({'error': f'mode inválido, use {" ou ".join(IMPORT_MODES)}'}), 400
+    delete_missing = (request.args.get('delete_missing') == '1'
+                      or request.form.get('delete_missing') == '1')
+    if delete_missing and mode != 'upsert':
+        return jsonify({'error': 'delete_missing requer mode=upsert'}), 400
+    
+    # Large uploads can run in the background, in any mode, and be polled
+    # via /api/imports
+    if request.args.get('async') == '1' or request.form.get('async') == '1':
+        job_id = collection.import_jobs.submit(file, file.filename, batch_size, mode,
+                                               delete_missing)
+        return jsonify({'job_id': job_id,
+                        'status_url': url_for('.get_import_job', job_id=job_id)}), 202
+    
+    try:
+        try:
+            report = import_file(collection.repository, file, file.filename, batch_size, mode,
+                                 delete_missing)
+        finally:
+            # Batches committed before a failure are visible too
+            collection.response_cache.bump()
+        return jsonify({'message': report.message(), 'report': report.to_dict()})
         
     except Exception as e:
         return jsonify({'error': f'Erro ao importar arquivo: {str(e)}'}), 500
 
-@app.route('/api/summary')
+@api.route('/imports', methods=['GET'])
+def list_import_jobs():
+    collection = g.collection
+    return jsonify(collection.import_jobs.list())
+
+@api.route('/imports/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    collection = g.collection
+    job = collection.import_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Importação não encontrada'}), 404
+    return jsonify(job)
+
+@api.route('/imports/<job_id>', methods=['DELETE'])
+def cancel_import_job(job_id):
+    collection = g.collection
+    job = collection.import_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Importação não encontrada'}), 404
+    return jsonify(job)
+
+@api.route('/summary')
+@cached
 def get_summary():
-    conn = sqlite3.connect('livros.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            SUM(total_livros) as total_books,
-            SUM(valor_euros) as total_value,
-            AVG(preco_medio) as avg_price,
-            SUM(livros_faltantes) as missing_books
-        FROM livros
-    ''')
-    
-    result = cursor.fetchone()
-    conn.close()
+    collection = g.collection
+    result = collection.repository.summary()
     
     return jsonify({
         'total_books': result[0] or 0,
@@ -164,6 +447,146 @@ def get_summary():
         'missing_books': result[3] or 0
     })
 
+@api.route('/stats')
+@cached
+def get_stats():
+    collection = g.collection
+    # Histograms, percentiles, top-N and group-bys over the in-memory snapshot
+    try:
+        bins = max(1, min(int(request.args.get('bins', DEFAULT_BINS)), MAX_BINS))
+        top = max(0, min(int(request.args.get('top', DEFAULT_TOP)), MAX_TOP))
+    except ValueError:
+        return jsonify({'error': 'bins e top devem ser inteiros'}), 400
+    group_by = [name.strip() for name in request.args.get('group_by', 'completion').split(',')
+                if name.strip()]
+    unknown = [name for name in group_by if name not in GROUP_BY]
+    if unknown:
+        return jsonify({'error': f"Agrupamentos inválidos: {', '.join(unknown)}"}), 400
+    
+    snapshot = collection.stats_snapshot.get(collection.repository)
+    return jsonify(collection_stats(snapshot, bins=bins, top=top, group_by=group_by))
+
+@app.route('/metrics')
+def get_metrics():
+    # Prometheus text format; per process when serving with several workers
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/summary/check', methods=['GET', 'POST'])
+def check_summary():
+    # GET only compares; POST also rewrites the stored summary if it drifted
+    collection = g.collection
+    result = collection.repository.verify_summary(repair=request.method == 'POST')
+    if result['repaired']:
+        collection.response_cache.bump()
+    keys = ('total_books', 'total_value', 'avg_price', 'missing_books')
+    return jsonify({
+        'consistent': result['consistent'],
+        'repaired': result['repaired'],
+        'stored': dict(zip(keys, result['stored'])),
+        'scanned': dict(zip(keys, result['scanned']))
+    })
+
+@app.route('/api/collections', methods=['GET'])
+def list_collections():
+    return jsonify({'collections': registry.names(), 'default': DEFAULT_COLLECTION})
+
+@app.route('/api/collections', methods=['POST'])
+def create_collection():
+    data = request.get_json(silent=True)
+    name = data.get('name') if isinstance(data, dict) else None
+    if not isinstance(name, str):
+        return jsonify({'error': 'Campo name obrigatório'}), 400
+    try:
+        registry.create(name)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileExistsError:
+        return jsonify({'error': f'A coleção {name} já existe'}), 409
+    fanout_cache.bump()
+    return jsonify({'message': 'Coleção criada com sucesso!', 'name': name}), 201
+
+def _fan_out(func):
+    """func(collection) on every collection in parallel: ([(collection, result)], errors)."""
+    results, errors = [], {}
+    for collection, result, error in fan_out(func, all_collections()):
+        if error is None:
+            results.append((collection, result))
+        else:
+            errors[collection.name] = str(error)
+    return results, errors
+
+@app.route('/api/collections/summary')
+@cached
+def get_collections_summary():
+    # The raw summary counters of every collection, read in parallel and added up
+    results, errors = _fan_out(lambda collection: collection.repository.summary_totals())
+    keys = ('row_count', 'total_books', 'total_cents', 'missing_books', 'price_sum',
+            'price_count')
+    totals = dict.fromkeys(keys, 0)
+    summaries = []
+    for collection, row in results:
+        row = dict(zip(keys, row))
+        for key in keys:
+            totals[key] += row[key]
+        summaries.append({'collection': collection.name, **_summary_dict(row)})
+    return jsonify({
+        'collections': summaries,
+        'total': _summary_dict(totals),
+        'errors': errors,
+    })
+
+def _summary_dict(row):
+    # Same fields as /api/summary
+    return {
+        'total_books': row['total_books'],
+        'total_value': row['total_cents'] / 100.0,
+        'avg_price': row['price_sum'] / row['price_count'] if row['price_count'] else 0,
+        'missing_books': row['missing_books'],
+    }
+
+@app.route('/api/collections/search')
+@cached
+def search_collections():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q obrigatório'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit inválido'}), 400
+    
+    # bm25 ranks use each file's own term statistics, so they can't be
+    # compared across collections: the per-collection results are
+    # interleaved by position instead, every collection's best match first
+    results, errors = _fan_out(lambda collection: collection.repository.search_names(query, limit))
+    rounds = itertools.zip_longest(*(
+        [(collection.name, book) for book in rows] for collection, rows in results
+    ))
+    merged = (item for round_ in rounds for item in round_ if item is not None)
+    books = [{'collection': name, **book_to_dict(book)}
+             for name, book in itertools.islice(merged, limit)]
+    return jsonify({'books': books, 'errors': errors})
+
+# The collection routes, for the default collection and for any collection
+app.register_blueprint(api, url_prefix='/api')
+app.register_blueprint(api, url_prefix='/api/collections/<collection>', name='collection')
+
 if __name__ == '__main__':
-    init_db()
+    parser = argparse.ArgumentParser(description='API de livros (servidor de desenvolvimento)')
+    parser.add_argument('--metrics', action='store_true',
+                        help='mede rotas, SQL e importações (exposto em /metrics)')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='grava um perfil cProfile por pedido neste diretório')
+    args = parser.parse_args()
+    if args.metrics or args.profile:
+        metrics.configure(metrics=args.metrics or None, profile=args.profile)
+        # Also seen by the reloader's child process
+        os.environ['LIVROS_METRICS'] = '1' if metrics.enabled() else '0'
+        if args.profile:
+            os.environ['LIVROS_PROFILE_DIR'] = os.path.abspath(args.profile)
+        metrics.instrument_app(app)
+    
+    # The reloader runs this module in a watching parent and again in the
+    # serving child (WERKZEUG_RUN_MAIN); only the child resumes imports
+    init_db(recover=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""ASGI entry point for the REST API.
+
+The Flask routes in app.py are served unchanged: each request runs start to
+finish on a bounded thread pool, so the blocking sqlite3 calls never stall
+the event loop and at most LIVROS_DB_THREADS requests touch SQLite at once.
+
+Run it with serve.py, or with any ASGI server: uvicorn asgi:application
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import app as api
+
+DB_THREADS = int(os.environ.get('LIVROS_DB_THREADS', 8))
+
+# Request bodies larger than this (e.g. spreadsheet uploads) spill to disk
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+class WsgiBridge:
+    """Minimal ASGI adapter for a WSGI app, with a lifespan for app.py."""
+
+    def __init__(self, wsgi_app, max_threads=DB_THREADS, recover=True):
+        self.wsgi_app = wsgi_app
+        self.max_threads = max_threads
+        self.recover = recover
+        self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_threads,
+                                               thread_name_prefix='request')
+        return self.executor
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await loop.run_in_executor(self._executor(), api.init_db, self.recover)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # The server has stopped accepting requests and drained the
+                # open ones; let queued work finish, then release SQLite
+                executor, self.executor = self.executor, None
+                if executor is not None:
+                    await loop.run_in_executor(None, executor.shutdown, True)
+                await loop.run_in_executor(None, api.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor(), self._run,
+                                       build_environ(scope, body), send, loop)
+        finally:
+            body.close()
+
+    def _run(self, environ, send, loop):
+        # Runs on a pool thread; the whole response, including streamed
+        # exports, is produced here so Flask's request context stays on
+        # one thread
+        start = {}
+
+        def start_response(status, headers, exc_info=None):
+            start['status'] = int(status.split(' ', 1)[0])
+            start['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers]
+
+        def emit(message):
+            # Waits for the event loop, which gives streaming back-pressure
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def emit_start():
+            emit({'type': 'http.response.start', 'status': start['status'],
+                  'headers': start['headers']})
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            started = False
+            for chunk in iterable:
+                if not chunk:
+                    continue
+                if not started:
+                    emit_start()
+                    started = True
+                emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not started:
+                emit_start()
+            emit({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope (PEP 3333 string conventions)."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = name
+        else:
+            key = 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    # The body is spooled in full; a chunked request has no Content-Length,
+    # without which Werkzeug would read it as empty
+    if 'CONTENT_LENGTH' not in environ:
+        environ['CONTENT_LENGTH'] = str(body.seek(0, os.SEEK_END))
+        body.seek(0)
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+
+# serve.py recovers interrupted imports in the parent process when it runs
+# several workers, and tells the workers not to
+application = WsgiBridge(api.app, recover=os.environ.get('LIVROS_RECOVER_IMPORTS', '1') == '1')
@@ -0,0 +1,75 @@
+"""Cross-collection search: one file after the other versus registry.fan_out.
+
+Seeds --collections synthetic collections of --rows rows each and times the
+query behind /api/collections/search on all of them, run sequentially and
+on the fan-out thread pool.
+
+Usage: python benchmarks/bench_collections.py [--collections N] [--rows N] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic
+from registry import FANOUT_WORKERS, CollectionRegistry, fan_out
+from database import BookRepository, ConnectionPool
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--collections', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--query', default=synthetic.SEARCH_TERM)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='livros_colecoes_') as tmp:
+        registry = CollectionRegistry(os.path.join(tmp, 'livros.db'), tmp)
+        for i in range(1, args.collections):
+            registry.create(f'loja{i}')
+        repositories = []
+        for i, db_path in enumerate(registry.paths().values()):
+            synthetic.seed_database(db_path, args.rows, seed=42 + i)
+            repositories.append(BookRepository(ConnectionPool(db_path)))
+
+        def search(repository):
+            return repository.search_names(args.query, args.limit)
+
+        # Warm every thread's connection and the page cache first
+        for _ in range(2):
+            fan_out(search, repositories)
+            [search(repository) for repository in repositories]
+
+        sequential = timed(lambda: [search(repository) for repository in repositories],
+                           args.repeat)
+        parallel = timed(lambda: fan_out(search, repositories), args.repeat)
+        for repository in repositories:
+            repository.pool.close_all()
+
+    print(f"{args.collections} coleções x {args.rows} linhas, "
+          f"pesquisa '{args.query}' (limit {args.limit}), {FANOUT_WORKERS} threads")
+    print(f"sequencial:  {sequential * 1000:8.1f} ms")
+    print(f"fan-out:     {parallel * 1000:8.1f} ms")
+    print(f"speedup:     {sequential / parallel:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
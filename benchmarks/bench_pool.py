@@ -0,0 +1,161 @@
+"""Requests/sec of the REST API with per-request connections vs the pool.
+
+Measured twice: through the test client on a fixed set of threads, and
+through Werkzeug's threaded server (what `python app.py` runs), which
+starts a thread per request. For the latter it also reports how many
+connections the pool holds afterwards, which must not grow with requests.
+
+Usage: python benchmarks/bench_pool.py [--rows N] [--requests N] [--threads N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, g, jsonify
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app as api
+from database import BookRepository, ConnectionPool
+
+
+def build_legacy_app(db_path):
+    # Mirrors the original handlers: one sqlite3.connect per request
+    legacy = Flask('legacy')
+
+    @legacy.route('/api/books/<int:book_id>', methods=['GET'])
+    def get_book(book_id):
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM livros WHERE id=?", (book_id,))
+        book = cursor.fetchone()
+        conn.close()
+        return jsonify(book)
+
+    @legacy.route('/api/summary')
+    def get_summary():
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT SUM(total_livros), SUM(valor_euros), AVG(preco_medio),
+                   SUM(livros_faltantes)
+            FROM livros
+        ''')
+        result = cursor.fetchone()
+        conn.close()
+        return jsonify(result)
+
+    return legacy
+
+
+def build_pooled_app(db_path):
+    api.configure_database(db_path)
+    pooled = Flask('pooled')
+
+    @pooled.before_request
+    def use_default_collection():
+        # What the api blueprint does for /api/... routes
+        g.collection = api.default_collection
+
+    @pooled.route('/api/books/<int:book_id>', methods=['GET'])
+    def get_book(book_id):
+        return jsonify(api.default_collection.repository.get_book(book_id))
+
+    pooled.add_url_rule('/api/summary', view_func=api.get_summary)
+    return pooled
+
+
+def seed(db_path, rows):
+    repository = BookRepository(ConnectionPool(db_path))
+    repository.init_schema()
+    repository.insert_many(
+        (f'Livro {i}', i % 50, i * 1.5, i % 7)
+        for i in range(rows)
+    )
+    repository.pool.close_all()
+
+
+def run(flask_app, paths, requests, threads):
+    def worker(count):
+        client = flask_app.test_client()
+        for i in range(count):
+            client.get(paths[i % len(paths)])
+
+    per_thread = requests // threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, [per_thread] * threads))
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def run_server(flask_app, paths, requests, threads):
+    """Same as run(), over HTTP against the threaded development server."""
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.port}'
+
+    def worker(count):
+        for i in range(count):
+            with urllib.request.urlopen(base + paths[i % len(paths)]) as response:
+                response.read()
+
+    per_thread = requests // threads
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, [per_thread] * threads))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        seed(db_path, args.rows)
+        paths = [f'/api/books/{i}' for i in range(1, 101)] + ['/api/summary']
+
+        before = run(build_legacy_app(db_path), paths, args.requests, args.threads)
+        after = run(build_pooled_app(db_path), paths, args.requests, args.threads)
+        server_before = run_server(build_legacy_app(db_path), paths, args.requests, args.threads)
+        server_after = run_server(build_pooled_app(db_path), paths, args.requests, args.threads)
+        # Request threads hand their connection back as they end
+        time.sleep(0.1)
+        open_connections = api.default_collection.repository.pool.open_connections()
+        api.shutdown()
+
+    print('test client')
+    print(f"  per-request connect: {before:10.1f} req/s")
+    print(f"  pooled connections:  {after:10.1f} req/s")
+    print(f"  speedup:             {after / before:10.2f}x")
+    print('threaded server')
+    print(f"  per-request connect: {server_before:10.1f} req/s")
+    print(f"  pooled connections:  {server_after:10.1f} req/s")
+    print(f"  speedup:             {server_after / server_before:10.2f}x")
+    print(f"  open connections:    {open_connections:10d} after {args.requests} requests")
+
+
+if __name__ == '__main__':
+    main()
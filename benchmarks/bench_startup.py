@@ -0,0 +1,82 @@
+"""Cold-start time of the desktop app.
+
+Always measures, in fresh interpreters, how long importing book_collection
+takes, both as shipped and with the importer (pandas) loaded eagerly as it
+used to be. With a display (e.g. under xvfb-run) it also launches the app
+with --startup-profile --exit-after-start and reports time to first paint,
+or runs a PyInstaller build given with --exe.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--rows N] [--exe PATH]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import headless
+import synthetic
+
+IMPORTS = {
+    'lazy': 'import book_collection',
+    'eager': 'import book_collection, importer',
+}
+
+
+def wall_time(command, env=None):
+    started = time.perf_counter()
+    subprocess.run(command, cwd=BASE_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def launch(command, db_path, runs):
+    """Median wall time and per-phase medians of full launches."""
+    walls, phases = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        report = os.path.join(tmp, 'startup.json')
+        for _ in range(runs):
+            walls.append(wall_time(command + ['--db', db_path, '--startup-profile', report,
+                                              '--exit-after-start']))
+            with open(report, encoding='utf-8') as f:
+                for name, seconds in json.load(f).items():
+                    phases.setdefault(name, []).append(seconds)
+    return statistics.median(walls), {name: statistics.median(v) for name, v in phases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--exe', help='executável gerado pelo PyInstaller')
+    args = parser.parse_args()
+
+    for label, code in IMPORTS.items():
+        timings = [wall_time([sys.executable, '-c', code]) for _ in range(args.runs)]
+        print(f"import ({label}):  {statistics.median(timings) * 1000:8.1f} ms")
+
+    if not headless.has_display():
+        print('sem display: arranque completo não medido (use xvfb-run)')
+        return
+
+    with tempfile.TemporaryDirectory(prefix='livros_startup_') as tmp:
+        db_path = synthetic.seed_database(os.path.join(tmp, 'livros.db'), args.rows)
+        command = [args.exe] if args.exe else [sys.executable,
+                                               os.path.join(BASE_DIR, 'book_collection.py')]
+        wall, phases = launch(command, db_path, args.runs)
+    for name, seconds in phases.items():
+        print(f"{name:<16} {seconds * 1000:8.1f} ms")
+    print(f"{'processo':<16} {wall * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""BookCollectionApp without a screen, for timing desktop code paths.
+
+With a display (e.g. under xvfb-run) the real ttkbootstrap window is built
+and withdrawn. Without one, the widgets the timed paths touch are replaced
+by minimal stand-ins; SQLite access, VirtualTreeview windowing and sorting
+still run unchanged.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import book_collection
+from book_collection import BookCollectionApp
+from virtual_tree import VirtualTreeview
+
+COLUMNS = tuple(book_collection.COLUMN_MAP)
+
+
+class FakeTree:
+    """The subset of ttk.Treeview used by VirtualTreeview and the app."""
+
+    def __init__(self, height=30):
+        self.height = height
+        self.items = {}
+        self.order = []
+        self.selected = ()
+        self.focused = ''
+        self.headings = {}
+
+    def __getitem__(self, key):
+        if key == 'columns':
+            return COLUMNS
+        raise KeyError(key)
+
+    def bind(self, sequence, func, add=None):
+        pass
+
+    def winfo_height(self):
+        return 25 + self.height * 20
+
+    def cget(self, key):
+        return self.height
+
+    def bbox(self, item):
+        return (0, 25, 100, 20)
+
+    def heading(self, column, **options):
+        self.headings[column] = options
+
+    def get_children(self, item=''):
+        return tuple(self.order)
+
+    def exists(self, item):
+        return item in self.items
+
+    def insert(self, parent, index, iid=None, values=()):
+        self.items[iid] = values
+        if index == 'end' or index >= len(self.order):
+            self.order.append(iid)
+        else:
+            self.order.insert(index, iid)
+        return iid
+
+    def delete(self, *items):
+        for item in items:
+            self.order.remove(item)
+            del self.items[item]
+        self.selected = tuple(i for i in self.selected if i in self.items)
+
+    def move(self, item, parent, index):
+        self.order.remove(item)
+        self.order.insert(index, item)
+
+    def index(self, item):
+        return self.order.index(item)
+
+    def item(self, item, values=None, **options):
+        if values is not None:
+            self.items[item] = values
+            return None
+        return {'values': self.items[item]}
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, *items):
+        self.selected = items
+
+    def selection_remove(self, *items):
+        self.selected = tuple(i for i in self.selected if i not in items)
+
+    def focus(self, item=None):
+        if item is None:
+            return self.focused
+        self.focused = item
+        return None
+
+
+class FakeScrollbar:
+    def configure(self, **options):
+        pass
+
+    def set(self, first, last):
+        pass
+
+
+class FakeLabel:
+    def __init__(self):
+        self.text = ''
+
+    def config(self, text=None, **options):
+        if text is not None:
+            self.text = text
+
+
+class FakeVar:
+    def __init__(self, value=''):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class QuietDialogs:
+    """Stands in for filedialog and messagebox while timing."""
+
+    path = None
+    answer = False
+
+    def askopenfilename(self, **options):
+        return self.path
+
+    def askyesno(self, *args, **kwargs):
+        return self.answer
+
+    def showinfo(self, *args, **kwargs):
+        pass
+
+    showwarning = showerror = showinfo
+
+
+def has_display():
+    try:
+        import tkinter
+        root = tkinter.Tk()
+        root.destroy()
+        return True
+    except Exception:
+        return False
+
+
+def make_app(db_path, real=None):
+    """(app, mode), where mode is 'tk' or 'mock'."""
+    dialogs = QuietDialogs()
+    book_collection.filedialog = dialogs
+    book_collection.messagebox = dialogs
+
+    if real is None:
+        real = has_display()
+    if real:
+        root = book_collection.ttk.Window(themename='cosmo')
+        root.withdraw()
+        app = BookCollectionApp(root, db_path=db_path)
+        app.dialogs = dialogs
+        return app, 'tk'
+
+    app = BookCollectionApp.__new__(BookCollectionApp)
+    app.root = None
+    app.db_path = db_path
+    app.debug = False
+    app.sort_order = []
+    app.filtered_totals = None
+    app.status_label = None
+    app.search_var = FakeVar()
+    app.filter_var = FakeVar('Todos')
+    for name in ('total_books_label', 'total_value_label', 'avg_price_label',
+                 'missing_books_label', 'row_count_label'):
+        setattr(app, name, FakeLabel())
+    app.init_database()
+    app.tree = FakeTree()
+    app.table = VirtualTreeview(app.tree, FakeScrollbar())
+    app.dialogs = dialogs
+    app.load_books()
+    return app, 'mock'
+
+
+def close_app(app):
+    if app.root is not None:
+        app.live_search.shutdown()
+        app.root.destroy()
+    app.repo.pool.close_all()
@@ -0,0 +1,195 @@
+"""p50/p99 latency and throughput of the REST API under concurrent load.
+
+Usage:
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 [--concurrency N]
+                                   [--duration S] [--path /api/summary ...]
+    python benchmarks/load_test.py --compare [--rows N] [--workers N]
+
+--url measures a server that is already running. --compare seeds a temporary
+database, starts the Werkzeug dev server (app.app.run, as app.py does) and
+then serve.py on it, and measures both with the same load.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+DEFAULT_PATHS = ('/api/books', '/api/summary')
+
+DEV_SERVER = '''
+import sys, app
+app.init_db()
+app.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)
+'''
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(url, path, concurrency, duration):
+    parsed = urllib.parse.urlsplit(url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        # One keep-alive connection per client thread; http.client
+        # reconnects by itself when the server closes it
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+        local = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                continue
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'path': path,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def measure(label, url, paths, concurrency, duration):
+    results = []
+    for path in paths:
+        result = run_load(url, path, concurrency, duration)
+        result['server'] = label
+        results.append(result)
+        print(f"{label:>6} {path:<16} {result['requests']:>8} req  {result['rps']:>9.1f} req/s  "
+              f"p50 {result['p50_ms']:>7.2f} ms  p99 {result['p99_ms']:>7.2f} ms  "
+              f"erros {result['errors']}")
+    return results
+
+
+def wait_ready(url, process, timeout=30):
+    parsed = urllib.parse.urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Servidor terminou com código {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=1)
+            conn.request('GET', '/api/summary')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Servidor não respondeu a tempo')
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def seed(db_path, rows):
+    from database import BookRepository, ConnectionPool
+    repository = BookRepository(ConnectionPool(db_path))
+    repository.init_schema()
+    repository.insert_many(
+        (f'Livro {i}', i % 7, round(i * 0.37, 2), i % 3)
+        for i in range(rows)
+    )
+    repository.pool.close_all()
+
+
+def compare(args):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='livros_load_'), 'livros.db')
+    seed(db_path, args.rows)
+    env = dict(os.environ, LIVROS_DB=db_path)
+    servers = [
+        ('dev', [sys.executable, '-c', DEV_SERVER, str(args.port)]),
+        ('asgi', [sys.executable, os.path.join(BASE_DIR, 'serve.py'), '--host', '127.0.0.1',
+                  '--port', str(args.port + 1), '--workers', str(args.workers)]),
+    ]
+    results = []
+    for offset, (label, command) in enumerate(servers):
+        url = f'http://127.0.0.1:{args.port + offset}'
+        process = subprocess.Popen(command, cwd=BASE_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(url, process)
+            results.extend(measure(label, url, args.path, args.concurrency, args.duration))
+        except RuntimeError as e:
+            print(f'{label}: {e}')
+        finally:
+            stop(process)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='servidor já em execução')
+    parser.add_argument('--compare', action='store_true',
+                        help='compara o servidor de desenvolvimento com serve.py')
+    parser.add_argument('--path', action='append', help='rota a medir (repetível)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--json', help='grava os resultados neste arquivo')
+    args = parser.parse_args()
+    args.path = args.path or list(DEFAULT_PATHS)
+
+    if args.compare:
+        results = compare(args)
+    elif args.url:
+        results = measure('url', args.url, args.path, args.concurrency, args.duration)
+    else:
+        parser.error('use --url ou --compare')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""Benchmark suite for the key API and desktop paths on synthetic collections.
+
+Each case runs --repeat times per size on a freshly seeded temporary
+database. Read paths clear the response cache first, so they time the SQL
+and encoding work rather than a cache hit. Results go to a JSON file that
+can be passed back as --baseline to flag regressions.
+
+Usage:
+    python benchmarks/run_suite.py [--sizes 1k,100k,1m] [--cases a,b] [--repeat 3]
+                                   [--output FILE] [--baseline FILE] [--tolerance 0.25]
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import app as api
+import headless
+import synthetic
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+def case_import_api(ctx):
+    # POST /api/books/import (synchronous) into an empty database
+    def setup():
+        api.configure_database(ctx.fresh_db())
+        api.init_db()
+        with open(synthetic.workbook_path(ctx.rows), 'rb') as f:
+            return io.BytesIO(f.read())
+
+    def run(upload):
+        response = ctx.client.post('/api/books/import',
+                                   data={'file': (upload, 'livros.xlsx')})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    return setup, run
+
+
+def case_import_parquet(ctx):
+    # POST /api/books/import with a Parquet file into an empty database
+    def setup():
+        api.configure_database(ctx.fresh_db())
+        api.init_db()
+        with open(synthetic.parquet_path(ctx.rows), 'rb') as f:
+            return io.BytesIO(f.read())
+
+    def run(upload):
+        response = ctx.client.post('/api/books/import',
+                                   data={'file': (upload, 'livros.parquet')})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    return setup, run
+
+
+def case_reimport_unchanged(ctx):
+    # POST /api/books/import?mode=upsert of the Parquet file already imported:
+    # every row is matched by name and skipped on its content hash
+    def setup():
+        api.configure_database(ctx.fresh_db())
+        api.init_db()
+        with open(synthetic.parquet_path(ctx.rows), 'rb') as f:
+            data = f.read()
+        response = ctx.client.post('/api/books/import?mode=upsert',
+                                   data={'file': (io.BytesIO(data), 'livros.parquet')})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return io.BytesIO(data)
+
+    def run(upload):
+        response = ctx.client.post('/api/books/import?mode=upsert',
+                                   data={'file': (upload, 'livros.parquet')})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.get_json()['report']['unchanged'] == ctx.rows
+
+    return setup, run
+
+
+def case_export_parquet(ctx):
+    # GET /api/books/export?format=parquet, streamed batch by batch
+    def run(_):
+        response = ctx.client.get('/api/books/export?format=parquet')
+        assert response.status_code == 200
+        response.get_data()
+
+    return None, run
+
+
+def case_import_desktop(ctx):
+    # BookCollectionApp.import_excel, including the table reload
+    def setup():
+        app, _ = headless.make_app(ctx.fresh_db(), real=ctx.real_tk)
+        app.dialogs.path = synthetic.workbook_path(ctx.rows)
+        ctx.cleanup.append(lambda: headless.close_app(app))
+        return app
+
+    def run(app):
+        app.import_excel()
+        assert app.table.total == ctx.rows
+
+    return setup, run
+
+
+def _api_get(ctx, path):
+    def setup():
+        api.default_collection.response_cache.bump()
+
+    def run(_):
+        response = ctx.client.get(path)
+        assert response.status_code == 200
+        response.get_data()
+
+    return setup, run
+
+
+def case_get_books_page(ctx):
+    return _api_get(ctx, '/api/books?limit=100&sort=-valor_euros')
+
+
+def case_get_books_all(ctx):
+    return _api_get(ctx, '/api/books')
+
+
+def case_get_summary(ctx):
+    return _api_get(ctx, '/api/summary')
+
+
+def case_search_api(ctx):
+    return _api_get(ctx, f'/api/books/search?q={synthetic.SEARCH_TERM}&limit=100')
+
+
+def case_stats_api(ctx):
+    # Report computation on an already loaded columnar snapshot
+    return _api_get(ctx, '/api/stats?group_by=completion,size')
+
+
+def case_search_desktop(ctx):
+    # The live-search worker query plus rendering its result
+    def run(app):
+        app.show_search_result(app.run_search_query(('names', synthetic.SEARCH_TERM, [])))
+
+    return ctx.app_setup, run
+
+
+def case_treeview_load(ctx):
+    def run(app):
+        app.load_books()
+
+    return ctx.app_setup, run
+
+
+def case_treeview_sort(ctx):
+    # First click on a heading: a new ORDER BY on an indexed column
+    def setup():
+        app = ctx.app_setup()
+        app.load_books()
+        return app
+
+    def run(app):
+        app.sort_treeview('Valor(€)')
+
+    return setup, run
+
+
+def case_treeview_reverse(ctx):
+    # Second click on the same heading: the loaded order is read backwards
+    def setup():
+        app = ctx.app_setup()
+        app.load_books()
+        app.sort_treeview('Valor(€)')
+        return app
+
+    def run(app):
+        app.sort_treeview('Valor(€)')
+
+    return setup, run
+
+
+def case_treeview_scroll(ctx):
+    # Page through the first 100 windows with the Page Down key
+    def setup():
+        app = ctx.app_setup()
+        app.load_books()
+        return app
+
+    def run(app):
+        for _ in range(100):
+            app.table.scroll(app.table.visible_rows())
+
+    return setup, run
+
+
+CASES = {
+    'import_api': case_import_api,
+    'import_parquet': case_import_parquet,
+    'reimport_unchanged': case_reimport_unchanged,
+    'import_desktop': case_import_desktop,
+    'export_parquet': case_export_parquet,
+    'get_books_page': case_get_books_page,
+    'get_books_all': case_get_books_all,
+    'get_summary': case_get_summary,
+    'search_api': case_search_api,
+    'stats_api': case_stats_api,
+    'search_desktop': case_search_desktop,
+    'treeview_load': case_treeview_load,
+    'treeview_sort': case_treeview_sort,
+    'treeview_reverse': case_treeview_reverse,
+    'treeview_scroll': case_treeview_scroll,
+}
+
+
+class Context:
+    """Per-size state shared by the cases: seeded database, client, app."""
+
+    def __init__(self, rows, tmp, real_tk):
+        self.rows = rows
+        self.tmp = tmp
+        self.real_tk = real_tk
+        self.cleanup = []
+        self._count = 0
+        self.db_path = synthetic.seed_database(self.fresh_db(), rows)
+        self.client = api.app.test_client()
+        self._app = None
+
+    def fresh_db(self):
+        self._count += 1
+        return os.path.join(self.tmp, f'bench_{self.rows}_{self._count}.db')
+
+    def use_seeded_api(self):
+        api.configure_database(self.db_path)
+        api.init_db(recover=False)
+
+    def app_setup(self):
+        if self._app is None:
+            self._app, self.tk_mode = headless.make_app(self.db_path, real=self.real_tk)
+            self.cleanup.append(lambda: headless.close_app(self._app))
+        return self._app
+
+    def close(self):
+        for func in reversed(self.cleanup):
+            func()
+        self.cleanup = []
+        api.shutdown()
+
+
+def measure(setup, run, repeat):
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        started = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['case'], r['rows']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\n{'caso':<18} {'linhas':>8} {'base (s)':>10} {'atual (s)':>10} {'razão':>7}")
+    for result in results:
+        before = baseline.get((result['case'], result['rows']))
+        if before is None:
+            continue
+        ratio = result['median_s'] / before['median_s'] if before['median_s'] else float('inf')
+        flag = ' <-- regressão' if ratio > 1 + tolerance else ''
+        print(f"{result['case']:<18} {result['rows']:>8} {before['median_s']:>10.4f} "
+              f"{result['median_s']:>10.4f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1k,100k', help='lista de 1k, 100k, 1m ou números')
+    parser.add_argument('--cases', help='casos a executar (padrão: todos): ' + ', '.join(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='arquivo JSON (padrão: benchmarks/results/<data>.json)')
+    parser.add_argument('--baseline', help='resultados anteriores para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='aumento relativo da mediana tolerado antes de acusar regressão')
+    parser.add_argument('--tk', choices=('auto', 'real', 'mock'), default='auto',
+                        help='Treeview real (requer display, ex. xvfb-run) ou simulada')
+    args = parser.parse_args()
+
+    sizes = [synthetic.parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    cases = [c.strip() for c in args.cases.split(',')] if args.cases else list(CASES)
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error('casos desconhecidos: ' + ', '.join(unknown))
+    real_tk = {'auto': None, 'real': True, 'mock': False}[args.tk]
+    if real_tk is None:
+        real_tk = headless.has_display()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='livros_bench_') as tmp:
+        for rows in sizes:
+            ctx = Context(rows, tmp, real_tk)
+            try:
+                for name in cases:
+                    ctx.use_seeded_api()
+                    setup, run = CASES[name](ctx)
+                    timings = measure(setup, run, args.repeat)
+                    result = {
+                        'case': name,
+                        'rows': rows,
+                        'runs': timings,
+                        'min_s': min(timings),
+                        'median_s': statistics.median(timings),
+                        'max_s': max(timings),
+                    }
+                    results.append(result)
+                    print(f"{name:<18} {rows:>8} linhas  mediana {result['median_s']:>9.4f} s  "
+                          f"min {result['min_s']:>9.4f} s")
+            finally:
+                ctx.close()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'treeview': 'tk' if real_tk else 'mock',
+            'generator_version': synthetic.GENERATOR_VERSION,
+        },
+        'results': results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime('%Y%m%d-%H%M%S.json'))
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResultados gravados em {output}')
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
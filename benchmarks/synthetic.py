@@ -0,0 +1,149 @@
+"""Deterministic synthetic collections for the benchmarks.
+
+The same (rows, seed) always produces the same data. Workbooks are slow to
+write at 1M rows, so they are cached under benchmarks/data/.
+
+Usage: python benchmarks/synthetic.py --rows 100000 [--xlsx] [--csv] [--parquet] [--db PATH]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import BookRepository, ConnectionPool, WRITABLE_COLUMNS
+from importer import EXCEL_COLUMNS
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Bump when the generated data changes, so cached files are not reused
+GENERATOR_VERSION = 1
+
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+# Series names give the full-text search realistic, repeated tokens
+SERIES = ('Astérix', 'Tintin', 'Mafalda', 'Turma da Mônica', 'Spirou', 'Lucky Luke',
+          'Corto Maltese', 'Valérian', 'Blake e Mortimer', 'Thorgal', 'Blueberry',
+          'Largo Winch', 'XIII', 'Sandman', 'Calvin e Haroldo', 'Mortadelo',
+          'Zé Carioca', 'Tex', 'Dylan Dog', 'Diabolik')
+EDITIONS = ('Coleção', 'Edição Especial', 'Integral', 'Clássicos', 'Álbum')
+
+SEARCH_TERM = 'tintin'
+
+
+def parse_size(text):
+    """'1k', '100k', '1m' or a plain number of rows."""
+    text = text.strip().lower()
+    if text in SIZES:
+        return SIZES[text]
+    return int(text)
+
+
+def synthetic_frame(rows, seed=42):
+    """DataFrame with the spreadsheet headers the importer expects."""
+    rng = np.random.default_rng(seed)
+    series = rng.integers(0, len(SERIES), rows)
+    editions = rng.integers(0, len(EDITIONS), rows)
+    num_livros = rng.integers(0, 60, rows)
+    faltantes = rng.integers(0, 10, rows)
+    valor = np.round(rng.uniform(0, 500, rows), 2)
+    names = [f'{EDITIONS[e]} {SERIES[s]} {i}' for i, (s, e) in enumerate(zip(series, editions))]
+    headers = list(EXCEL_COLUMNS)
+    return pd.DataFrame({
+        headers[0]: names,
+        headers[1]: num_livros,
+        headers[2]: valor,
+        headers[3]: faltantes,
+        headers[4]: num_livros + faltantes,
+        headers[5]: np.round(valor / np.maximum(num_livros, 1), 2),
+    })
+
+
+def _cached_path(rows, seed, extension):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, f'livros_{rows}_{seed}_v{GENERATOR_VERSION}.{extension}')
+
+
+def write_workbook(path, frame):
+    # openpyxl's write-only mode streams rows, pandas.to_excel keeps the
+    # whole sheet in memory and is several times slower at 1M rows
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(frame.columns))
+    for row in frame.itertuples(index=False, name=None):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def workbook_path(rows, seed=42):
+    path = _cached_path(rows, seed, 'xlsx')
+    if not os.path.exists(path):
+        tmp = path + '.tmp'
+        write_workbook(tmp, synthetic_frame(rows, seed))
+        os.replace(tmp, path)
+    return path
+
+
+def csv_path(rows, seed=42):
+    path = _cached_path(rows, seed, 'csv')
+    if not os.path.exists(path):
+        tmp = path + '.tmp'
+        synthetic_frame(rows, seed).to_csv(tmp, index=False)
+        os.replace(tmp, path)
+    return path
+
+
+def parquet_path(rows, seed=42):
+    # Written with the livros column names, as the export endpoint does
+    path = _cached_path(rows, seed, 'parquet')
+    if not os.path.exists(path):
+        frame = synthetic_frame(rows, seed)
+        frame.columns = [column for column, _ in EXCEL_COLUMNS.values()]
+        tmp = path + '.tmp'
+        frame.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    return path
+
+
+def seed_database(db_path, rows, seed=42, chunk=50000):
+    """Create the schema at db_path and fill livros with the synthetic rows."""
+    frame = synthetic_frame(rows, seed)
+    columns = [frame[header].tolist() for header, (column, _) in EXCEL_COLUMNS.items()
+               if column in WRITABLE_COLUMNS]
+    repository = BookRepository(ConnectionPool(db_path))
+    repository.init_schema()
+    for start in range(0, rows, chunk):
+        repository.insert_many(zip(*(column[start:start + chunk] for column in columns)))
+    repository.pool.close_all()
+    return db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='1k', help='1k, 100k, 1m ou um número')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--xlsx', action='store_true', help='gera (ou reutiliza) o .xlsx')
+    parser.add_argument('--csv', action='store_true', help='gera (ou reutiliza) o .csv')
+    parser.add_argument('--parquet', action='store_true', help='gera (ou reutiliza) o .parquet')
+    parser.add_argument('--db', help='cria uma base SQLite com os dados')
+    args = parser.parse_args()
+    rows = parse_size(args.rows)
+
+    if args.xlsx:
+        print(workbook_path(rows, args.seed))
+    if args.csv:
+        print(csv_path(rows, args.seed))
+    if args.parquet:
+        print(parquet_path(rows, args.seed))
+    if args.db:
+        print(seed_database(args.db, rows, args.seed))
+
+
+if __name__ == '__main__':
+    main()
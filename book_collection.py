@@ -1,16 +1,48 @@
+import time
+# Taken before the other imports so --startup-profile includes them
+STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import sqlite3
+from tkinter import ttk, messagebox, filedialog, simpledialog
 from datetime import datetime
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import os
-import pandas as pd
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from database import ConnectionPool, BookRepository, DuplicateName, parse_numeric_expression
+from registry import DEFAULT_COLLECTION, CollectionRegistry
+from virtual_tree import VirtualTreeview, QuerySource, PAGE_SIZE
+from live_search import LiveSearch
+
+logger = logging.getLogger('livros')
+
+# Treeview column -> livros column
+COLUMN_MAP = {
+    "ID": "id",
+    "Nome": "nome",
+    "Nº Livros": "num_livros",
+    "Valor(€)": "valor_euros",
+    "Livros em Falta": "livros_faltantes",
+    "Total Livros": "total_livros",
+    "Preço Médio(€)": "preco_medio"
+}
+
+TITLE = "Gerenciador de Coleção de Livros"
 
 class BookCollectionApp:
-    def __init__(self, root):
+    def __init__(self, root, db_path=None, debug=False, repo=None, registry=None,
+                 collection=DEFAULT_COLLECTION):
         self.root = root
-        self.root.title("Gerenciador de Coleção de Livros")
+        self.db_path = db_path
+        self.debug = debug
+        # Collections the window can switch between, each one its own file
+        self.registry = registry or CollectionRegistry(db_path)
+        self.collection = collection
+        self.root.title(f"{TITLE} - {collection}")
         self.root.geometry("1200x800")
         
         # Set theme and style
@@ -20,16 +52,24 @@ class BookCollectionApp:
         style.configure("Header.TLabel", font=("Helvetica", 14, "bold"))
         style.configure("Summary.TLabel", font=("Helvetica", 11))
         
-        # Initialize sort direction dictionary
-        self.sort_direction = {}
+        # Current sort as (column, descending) pairs; more than one after shift-click
+        self.sort_order = []
+        
+        # Summary totals of the current search, None when showing everything
+        self.filtered_totals = None
         
-        # Initialize database
-        self.init_database()
+        # Initialize database, unless open_collection already did
+        self.repo = repo
+        if self.repo is None:
+            self.init_database()
         
         # Create main frame with padding
         self.main_frame = ttk.Frame(self.root, padding="20")
         self.main_frame.pack(fill=BOTH, expand=YES)
         
+        # Create collection selector
+        self.create_collection_bar()
+        
         # Create search and filter section
         self.create_search_filter()
         
@@ -45,26 +85,99 @@ class BookCollectionApp:
         # Create summary section
         self.create_summary()
         
+        # Create debug status bar
+        self.create_status_bar()
+        
+        # Search as you type, with queries on a worker thread
+        self.live_search = LiveSearch(self.root, self.repo, self.run_search_query,
+                                      self.show_search_result, on_error=self.show_search_error,
+                                      on_latency=self.show_search_latency)
+        self.search_var.trace_add("write", lambda *args: self.on_search_changed())
+        self.filter_combo.bind("<<ComboboxSelected>>", lambda event: self.on_search_changed())
+        
         # Load initial data
         self.load_books()
 
     def init_database(self):
-        self.conn = sqlite3.connect('livros.db')
-        self.cursor = self.conn.cursor()
-        
-        # Create books table if it doesn't exist
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS livros (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                num_livros INTEGER,
-                valor_euros REAL,
-                livros_faltantes INTEGER,
-                total_livros INTEGER,
-                preco_medio REAL
-            )
-        ''')
-        self.conn.commit()
+        # Shared data-access layer, same one used by the REST API
+        self.repo = BookRepository(ConnectionPool(self.db_path))
+        self.repo.init_schema()
+
+    def create_collection_bar(self):
+        collection_frame = ttk.Frame(self.main_frame)
+        collection_frame.pack(fill=X)
+        
+        ttk.Label(collection_frame, text="Coleção:", style="Header.TLabel").pack(side=LEFT, padx=10)
+        self.collection_var = tk.StringVar(value=self.collection)
+        # The list is read again when opened, collections created through
+        # the API show up without a restart
+        self.collection_combo = ttk.Combobox(
+            collection_frame, textvariable=self.collection_var, values=self.registry.names(),
+            state="readonly", width=25,
+            postcommand=lambda: self.collection_combo.config(values=self.registry.names()))
+        self.collection_combo.pack(side=LEFT, padx=10)
+        self.collection_combo.bind("<<ComboboxSelected>>",
+                                   lambda event: self.switch_collection(self.collection_var.get()))
+        ttk.Button(collection_frame, text="Nova Coleção", command=self.new_collection,
+                  style="secondary.TButton", width=15).pack(side=LEFT, padx=10)
+
+    def new_collection(self):
+        name = simpledialog.askstring("Nova Coleção", "Nome da coleção:", parent=self.root)
+        if not name:
+            return
+        name = name.strip()
+        try:
+            self.registry.create(name)
+        except FileExistsError:
+            messagebox.showerror("Erro", f"A coleção {name} já existe!")
+            return
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao criar coleção: {str(e)}")
+            return
+        self.collection_var.set(name)
+        self.switch_collection(name)
+
+    def switch_collection(self, name):
+        if name == self.collection:
+            return
+        db_path = self.registry.path(name)
+        if db_path is None:
+            messagebox.showerror("Erro", f"Coleção não encontrada: {name}")
+            self.collection_var.set(self.collection)
+            return
+        
+        # Migrations and the first reads run off the Tk thread, as at start-up
+        self.live_search.cancel()
+        self.collection_combo.config(state="disabled")
+        self.set_status(f"Abrindo a coleção {name}...")
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(open_collection, db_path)
+        executor.shutdown(wait=False)
+        self.root.after(10, lambda: self.finish_switch(name, db_path, future))
+
+    def finish_switch(self, name, db_path, future):
+        if not future.done():
+            self.root.after(10, lambda: self.finish_switch(name, db_path, future))
+            return
+        self.collection_combo.config(state="readonly")
+        try:
+            repo = future.result()
+        except Exception as e:
+            logger.exception("Erro ao abrir a coleção %s: %s", name, e)
+            messagebox.showerror("Erro", f"Erro ao abrir a coleção {name}: {str(e)}")
+            self.collection_var.set(self.collection)
+            return
+        
+        old_repo = self.repo
+        self.repo, self.db_path, self.collection = repo, db_path, name
+        self.live_search.repo = repo
+        self.root.title(f"{TITLE} - {name}")
+        self.clear_fields()
+        # Reloads the table from the new collection
+        self.clear_filters()
+        self.set_status(f"Coleção {name}")
+        # Nothing refers to the old file any more
+        old_repo.pool.close_all()
 
     def create_search_filter(self):
         # Search and filter frame with custom style
@@ -115,6 +228,10 @@ class BookCollectionApp:
             setattr(self, entry_name, ttk.Entry(input_frame, width=30))
             getattr(self, entry_name).grid(row=i//3, column=i%3*2+1, padx=15, pady=10, sticky=EW)
         
+        # Total and average price are computed by the database
+        self.total_livros_entry.config(state="readonly")
+        self.preco_medio_entry.config(state="readonly")
+        
         for i in range(3):
             input_frame.columnconfigure(i*2+1, weight=1)
 
@@ -134,6 +251,8 @@ class BookCollectionApp:
                   style="secondary.TButton", width=20).pack(side=LEFT, padx=10)
         ttk.Button(button_frame, text="Importar Excel", command=self.import_excel, 
                   style="primary.TButton", width=20).pack(side=LEFT, padx=10)
+        ttk.Button(button_frame, text="Sincronizar Excel", command=self.sync_excel, 
+                  style="primary.TButton", width=20).pack(side=LEFT, padx=10)
 
     def create_treeview(self):
         # Treeview frame with modern style
@@ -152,13 +271,19 @@ class BookCollectionApp:
             self.tree.column(col, width=100, anchor=CENTER)
         
         # Add scrollbar with modern style
-        scrollbar = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=VERTICAL)
         
         # Pack treeview and scrollbar
         self.tree.pack(side=LEFT, fill=BOTH, expand=YES)
         scrollbar.pack(side=RIGHT, fill=Y)
         
+        # Only the visible rows exist as Treeview items, pages are fetched
+        # from SQLite as the user scrolls
+        self.table = VirtualTreeview(self.tree, scrollbar)
+        
+        # Shift-click on a heading adds the column to a multi-column sort
+        self.tree.bind("<Shift-Button-1>", self.on_heading_shift_click)
+        
         # Bind select event
         self.tree.bind("<<TreeviewSelect>>", self.on_select)
 
@@ -184,19 +309,28 @@ class BookCollectionApp:
         self.missing_books_label = ttk.Label(summary_frame, text="Livros em Falta: 0", 
                                            style="Summary.TLabel")
         self.missing_books_label.pack(side=LEFT, padx=30)
+        
+        self.row_count_label = ttk.Label(summary_frame, text="Registros: 0", 
+                                       style="Summary.TLabel")
+        self.row_count_label.pack(side=RIGHT, padx=30)
+
+    def create_status_bar(self):
+        # Keystroke-to-render latency of live search, only in debug mode
+        self.status_label = None
+        if not self.debug:
+            return
+        self.status_label = ttk.Label(self.root, text="Pronto", anchor=W,
+                                      style="secondary.TLabel", padding=(20, 2))
+        self.status_label.pack(side=BOTTOM, fill=X)
+
+    def set_status(self, text):
+        if self.status_label is not None:
+            self.status_label.config(text=text)
 
     def update_summary(self):
         try:
             # Get total books and value
-            self.cursor.execute('''
-                SELECT 
-                    SUM(total_livros) as total_books,
-                    SUM(valor_euros) as total_value,
-                    AVG(preco_medio) as avg_price,
-                    SUM(livros_faltantes) as missing_books
-                FROM livros
-            ''')
-            result = self.cursor.fetchone()
+            result = self.repo.summary()
             
             # Update labels with formatted values
             self.total_books_label.config(text=f"Total de Livros: {result[0] or 0}")
@@ -205,26 +339,53 @@ class BookCollectionApp:
             self.missing_books_label.config(text=f"Livros em Falta: {result[3] or 0}")
             
         except Exception as e:
-            print(f"Erro ao atualizar resumo: {str(e)}")
+            logger.exception("Erro ao atualizar resumo: %s", e)
 
+    def show_rows(self, source, total=None):
+        # Swap the data behind the virtual table and show its row count
+        self.table.set_source(source, total)
+        self.row_count_label.config(text=f"Registros: {self.table.total}")
+
+    @metrics.timed_action("load_books")
     def load_books(self):
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Load books from database
-        self.cursor.execute("SELECT * FROM livros")
-        for book in self.cursor.fetchall():
-            self.tree.insert("", END, values=book)
+        # Load books from database, one window at a time
+        self.filtered_totals = None
+        self.show_rows(QuerySource(self.repo))
         
         # Update summary
         self.update_summary()
         
         # Reset sort direction indicators
-        for col in self.tree['columns']:
-            self.tree.heading(col, text=col)
-            self.sort_direction[col] = False
+        self.sort_order = []
+        self.update_sort_headings()
+
+    def apply_change(self, old_row, new_row):
+        # Row-level refresh after one add, update or delete: only the affected
+        # Treeview item changes and the summary is adjusted by deltas
+        was_in_view = old_row is not None and self.table.in_view(old_row)
+        if old_row is None:
+            self.table.apply_insert(new_row)
+        elif new_row is None:
+            self.table.apply_delete(old_row[0])
+        else:
+            self.table.apply_update(old_row, new_row)
+        self.row_count_label.config(text=f"Registros: {self.table.total}")
+        
+        if self.filtered_totals is None:
+            # The unfiltered summary is maintained by triggers, reading it is O(1)
+            self.update_summary()
+            return
+        
+        totals = self.filtered_totals
+        for row, sign, counted in ((old_row, -1, was_in_view),
+                                   (new_row, 1, new_row is not None and self.table.in_view(new_row))):
+            if counted:
+                totals[0] += sign * (row[5] or 0)  # total_livros column
+                totals[1] += sign * (row[3] or 0)  # valor_euros column
+                totals[2] += sign * (row[4] or 0)  # livros_faltantes column
+        self.show_filtered_totals(*totals)
 
+    @metrics.timed_action("add_book")
     def add_book(self):
         try:
             # Get values from entries
@@ -232,11 +393,9 @@ class BookCollectionApp:
             num_livros = self.num_livros_entry.get().strip()
             valor = self.valor_entry.get().strip()
             livros_faltantes = self.livros_faltantes_entry.get().strip()
-            total_livros = self.total_livros_entry.get().strip()
-            preco_medio = self.preco_medio_entry.get().strip()
 
             # Check if all fields are empty
-            if not any([nome, num_livros, valor, livros_faltantes, total_livros, preco_medio]):
+            if not any([nome, num_livros, valor, livros_faltantes]):
                 messagebox.showerror("Erro", "Pelo menos um campo deve ser preenchido!")
                 return
 
@@ -256,89 +415,74 @@ class BookCollectionApp:
             except ValueError:
                 livros_faltantes = 0
 
-            try:
-                total_livros = int(total_livros) if total_livros else 0
-            except ValueError:
-                total_livros = 0
-
-            try:
-                preco_medio = float(preco_medio) if preco_medio else 0.0
-            except ValueError:
-                preco_medio = 0.0
-
             values = (
                 nome,
                 num_livros,
                 valor,
-                livros_faltantes,
-                total_livros,
-                preco_medio
+                livros_faltantes
             )
             
             # Insert into database
-            self.cursor.execute('''
-                INSERT INTO livros (nome, num_livros, valor_euros, livros_faltantes, 
-                                 total_livros, preco_medio)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', values)
-            self.conn.commit()
+            book_id = self.repo.add_book(values)
             
-            # Reload books and clear fields
-            self.load_books()
+            # Show the new row and clear fields
+            self.apply_change(None, self.repo.get_book(book_id))
             self.clear_fields()
             messagebox.showinfo("Sucesso", "Livro adicionado com sucesso!")
             
+        except DuplicateName as e:
+            messagebox.showerror("Erro", f"{str(e)}!")
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao adicionar livro: {str(e)}")
 
+    @metrics.timed_action("update_book")
     def update_book(self):
         try:
-            # Get selected item
-            selected_item = self.tree.selection()[0]
-            book_id = self.tree.item(selected_item)['values'][0]
+            # Get selected book, which may be scrolled out of view
+            book_id = self.table.selected_id
+            if book_id is None:
+                messagebox.showerror("Erro", "Selecione um livro primeiro!")
+                return
             
             # Get values from entries
             values = (
                 self.nome_entry.get(),
                 int(self.num_livros_entry.get() or 0),
                 float(self.valor_entry.get() or 0),
-                int(self.livros_faltantes_entry.get() or 0),
-                int(self.total_livros_entry.get() or 0),
-                float(self.preco_medio_entry.get() or 0),
-                book_id
+                int(self.livros_faltantes_entry.get() or 0)
             )
             
             # Update database
-            self.cursor.execute('''
-                UPDATE livros
-                SET nome=?, num_livros=?, valor_euros=?, livros_faltantes=?,
-                    total_livros=?, preco_medio=?
-                WHERE id=?
-            ''', values)
-            self.conn.commit()
+            old_row = self.repo.get_book(book_id)
+            self.repo.update_book(book_id, values)
             
-            # Reload books and clear fields
-            self.load_books()
+            # Refresh the edited row and clear fields
+            self.apply_change(old_row, self.repo.get_book(book_id))
             self.clear_fields()
             messagebox.showinfo("Sucesso", "Livro atualizado com sucesso!")
             
+        except DuplicateName as e:
+            messagebox.showerror("Erro", f"{str(e)}!")
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao atualizar livro: {str(e)}")
 
+    @metrics.timed_action("delete_book")
     def delete_book(self):
         try:
-            # Get selected item
-            selected_item = self.tree.selection()[0]
-            book_id = self.tree.item(selected_item)['values'][0]
+            # Get selected book, which may be scrolled out of view
+            book_id = self.table.selected_id
+            if book_id is None:
+                messagebox.showerror("Erro", "Selecione um livro primeiro!")
+                return
             
             # Confirm deletion
             if messagebox.askyesno("Confirmar", "Tem certeza que deseja excluir este livro?"):
                 # Delete from database
-                self.cursor.execute("DELETE FROM livros WHERE id=?", (book_id,))
-                self.conn.commit()
+                old_row = self.repo.get_book(book_id)
+                self.repo.delete_book(book_id)
                 
-                # Reload books and clear fields
-                self.load_books()
+                # Remove the row and clear fields
+                self.apply_change(old_row, None)
                 self.clear_fields()
                 messagebox.showinfo("Sucesso", "Livro excluído com sucesso!")
                 
@@ -346,14 +490,36 @@ class BookCollectionApp:
             messagebox.showerror("Erro", f"Erro ao excluir livro: {str(e)}")
 
     def clear_fields(self):
+        # Forget the selected book
+        self.table.selected_id = None
+        self.tree.selection_remove(*self.tree.selection())
+        
         # Clear all entry fields
         for entry in [self.nome_entry, self.num_livros_entry, self.valor_entry,
-                     self.livros_faltantes_entry, self.total_livros_entry, self.preco_medio_entry]:
+                     self.livros_faltantes_entry]:
+            entry.delete(0, END)
+        self.set_derived_fields("", "")
+
+    def set_derived_fields(self, total_livros, preco_medio):
+        # Read-only entries have to be unlocked to change their text
+        for entry, value in ((self.total_livros_entry, total_livros),
+                             (self.preco_medio_entry, preco_medio)):
+            entry.config(state="normal")
             entry.delete(0, END)
+            entry.insert(0, value)
+            entry.config(state="readonly")
 
     def on_select(self, event):
         # Get selected item
-        selected_item = self.tree.selection()[0]
+        selection = self.tree.selection()
+        if not selection:
+            return
+        selected_item = selection[0]
+        
+        # Re-selection after scrolling must not overwrite fields being edited
+        if int(selected_item) == self.table.selected_id:
+            return
+        self.table.selected_id = int(selected_item)
         values = self.tree.item(selected_item)['values']
         
         # Update entry fields
@@ -369,125 +535,121 @@ class BookCollectionApp:
         self.livros_faltantes_entry.delete(0, END)
         self.livros_faltantes_entry.insert(0, values[4])
         
-        self.total_livros_entry.delete(0, END)
-        self.total_livros_entry.insert(0, values[5])
-        
-        self.preco_medio_entry.delete(0, END)
-        self.preco_medio_entry.insert(0, values[6])
+        self.set_derived_fields(values[5], values[6])
+
+    def sync_excel(self):
+        # Updates the books already in the collection instead of skipping them
+        self.import_excel(mode='upsert')
 
-    def import_excel(self):
+    @metrics.timed_action("import_excel")
+    def import_excel(self, mode='append'):
         try:
             # Open file dialog
             file_path = filedialog.askopenfilename(
-                filetypes=[("Arquivos Excel", "*.xlsx *.xls")]
+                filetypes=[("Arquivos suportados", "*.xlsx *.xls *.csv *.parquet *.arrow *.feather"),
+                           ("Arquivos Excel", "*.xlsx *.xls"), ("Arquivos CSV", "*.csv"),
+                           ("Parquet / Arrow", "*.parquet *.arrow *.feather")]
             )
             
             if not file_path:
                 return
             
-            # Read Excel file
-            df = pd.read_excel(file_path)
-            
-            # Fill NaN values with appropriate defaults
-            df = df.fillna({
-                'NOME': '',
-                'Nº LIVROS': 0,
-                'VALOR(€)': 0.0,
-                'LIVROS EM FALTA': 0,
-                'TOTAL LIVROS': 0,
-                'PREÇO MÉDIO(€)': 0.0
-            })
+            delete_missing = mode == 'upsert' and messagebox.askyesno(
+                "Sincronizar", "Excluir também os livros que não estão no arquivo?")
             
-            # Insert data into database
-            for _, row in df.iterrows():
-                try:
-                    # Get values with defaults if columns don't exist
-                    nome = str(row.get('NOME', ''))
-                    num_livros = int(float(row.get('Nº LIVROS', 0)))
-                    valor = float(row.get('VALOR(€)', 0.0))
-                    livros_faltantes = int(float(row.get('LIVROS EM FALTA', 0)))
-                    total_livros = int(float(row.get('TOTAL LIVROS', 0)))
-                    preco_medio = float(row.get('PREÇO MÉDIO(€)', 0.0))
-                    
-                    values = (nome, num_livros, valor, livros_faltantes, total_livros, preco_medio)
-                    
-                    self.cursor.execute('''
-                        INSERT INTO livros (
-                            nome, num_livros, valor_euros, livros_faltantes,
-                            total_livros, preco_medio
-                        ) VALUES (?, ?, ?, ?, ?, ?)
-                    ''', values)
-                except Exception as row_error:
-                    print(f"Erro ao processar linha: {row_error}")
-                    continue
+            # pandas is only needed here and is most of the start-up time,
+            # so it is not imported with the window
+            from importer import import_file
             
-            self.conn.commit()
+            # Stream, validate and bulk insert the workbook batch by batch
+            report = import_file(self.repo, file_path, mode=mode, delete_missing=delete_missing)
             self.load_books()
-            messagebox.showinfo("Sucesso", f"Importados {len(df)} registros com sucesso!")
+            
+            if report.rejected:
+                details = "\n".join(f"Linha {e['row']}: {e['reason']}" for e in report.errors[:10])
+                messagebox.showwarning("Importação concluída", f"{report.message()}\n\n{details}")
+            else:
+                messagebox.showinfo("Sucesso", report.message())
             
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao importar arquivo Excel: {str(e)}")
 
-    def search_books(self):
+    def search_args(self, show_errors):
+        # Snapshot of what to search for, handed to the worker thread
         search_text = self.search_var.get().strip().lower()
         filter_column = self.filter_var.get()
+        if not search_text:
+            return None
         
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Name searches go through the full-text index, in relevance order
+        # until a column is sorted
+        if filter_column in ("Todos", "Nome"):
+            return ("names", search_text, self.db_order() if self.sort_order else [])
         
-        if not search_text:
+        # Numeric columns take typed filters ("10", "5-20", ">3") backed
+        # by the column indexes instead of a LIKE over their text
+        try:
+            filters = parse_numeric_expression(COLUMN_MAP[filter_column], search_text)
+        except ValueError as e:
+            if show_errors:
+                messagebox.showerror("Erro", f"{str(e)}\nUse por exemplo 10, 5-20, >3 ou <=2.5")
+            else:
+                self.set_status(str(e))
+            return False
+        return ("numeric", filters, self.db_order())
+
+    def on_search_changed(self):
+        # Every keystroke restarts the debounce timer
+        args = self.search_args(show_errors=False)
+        if args is None:
+            self.live_search.cancel()
+            self.load_books()
+        elif args:
+            self.live_search.request(args)
+
+    @metrics.timed_action("search_books")
+    def search_books(self):
+        args = self.search_args(show_errors=True)
+        if args is None:
+            self.live_search.cancel()
+            self.load_books()
+        elif args is False:
             self.load_books()
-            return
-        
-        # Build the query based on the selected filter
-        if filter_column == "Todos":
-            query = '''
-                SELECT * FROM livros 
-                WHERE LOWER(nome) LIKE ?
-            '''
-            params = [f'%{search_text}%']
         else:
-            # Map filter column names to database column names
-            column_map = {
-                "Nome": "nome",
-                "Nº Livros": "num_livros",
-                "Valor(€)": "valor_euros",
-                "Livros em Falta": "livros_faltantes",
-                "Total Livros": "total_livros",
-                "Preço Médio(€)": "preco_medio"
-            }
-            
-            db_column = column_map[filter_column]
-            query = f'SELECT * FROM livros WHERE LOWER({db_column}) LIKE ?'
-            params = [f'%{search_text}%']
-        
-        # Execute the search
-        self.cursor.execute(query, params)
-        results = self.cursor.fetchall()
-        
-        # Display results
-        for book in results:
-            self.tree.insert("", END, values=book)
-        
-        # Update summary with filtered results
-        self.update_summary_filtered(results)
+            self.live_search.request(args, delay_ms=0)
+
+    @metrics.timed_action("run_search_query")
+    def run_search_query(self, args):
+        # Runs on the search worker thread, with its own SQLite connection.
+        # Matching rows stay in SQLite and are paged in as needed; the count
+        # and totals are computed there too
+        kind, criteria, order = args
+        filters, name = (None, criteria) if kind == "names" else (criteria, None)
+        source = QuerySource(self.repo, filters=filters, order=order, name=name)
+        return (source, self.repo.count_books(filters, name),
+                self.repo.filtered_totals(filters, name))
+
+    @metrics.timed_action("show_search_result")
+    def show_search_result(self, result):
+        source, total, totals = result
+        self.show_rows(source, total)
+        self.show_filtered_totals(*totals)
+
+    def show_search_error(self, error):
+        logger.error("Erro na pesquisa: %s", error, exc_info=error)
+        self.set_status(f"Erro na pesquisa: {str(error)}")
 
-    def update_summary_filtered(self, results):
+    def show_search_latency(self, latency_ms, query_ms):
+        self.set_status(f"Pesquisa: {latency_ms:.1f} ms desde a última tecla "
+                        f"(consulta {query_ms:.1f} ms, {self.table.total} registros)")
+
+    def show_filtered_totals(self, total_books, total_value, missing_books):
         try:
-            if not results:
-                # If no results, show zeros
-                self.total_books_label.config(text="Total de Livros: 0")
-                self.total_value_label.config(text="Valor Total: 0.00 €")
-                self.avg_price_label.config(text="Preço Médio: 0.00 €")
-                self.missing_books_label.config(text="Livros em Falta: 0")
-                return
-            
-            # Calculate totals from filtered results
-            total_books = sum(row[5] for row in results)  # total_livros column
-            total_value = sum(row[3] for row in results)  # valor_euros column
+            total_books = total_books or 0
+            total_value = total_value or 0
+            missing_books = missing_books or 0
+            self.filtered_totals = [total_books, total_value, missing_books]
             avg_price = total_value / total_books if total_books > 0 else 0
-            missing_books = sum(row[4] for row in results)  # livros_faltantes column
             
             # Update labels
             self.total_books_label.config(text=f"Total de Livros: {total_books}")
@@ -496,51 +658,182 @@ class BookCollectionApp:
             self.missing_books_label.config(text=f"Livros em Falta: {missing_books}")
             
         except Exception as e:
-            print(f"Erro ao atualizar resumo filtrado: {str(e)}")
+            logger.exception("Erro ao atualizar resumo filtrado: %s", e)
 
     def clear_filters(self):
-        self.search_var.set("")
+        # Emptying the search box cancels any pending search and reloads
         self.filter_var.set("Todos")
-        self.load_books()
+        self.search_var.set("")
 
-    def sort_treeview(self, col):
-        # Get all items from treeview
-        items = [(self.tree.set(item, col), item) for item in self.tree.get_children('')]
-        
-        # Convert values based on column type
-        def convert_value(value):
-            if col in ["ID", "Nº Livros", "Livros em Falta", "Total Livros"]:
-                try:
-                    return int(value) if value else 0
-                except ValueError:
-                    return 0
-            elif col in ["Valor(€)", "Preço Médio(€)"]:
-                try:
-                    return float(value) if value else 0.0
-                except ValueError:
-                    return 0.0
-            else:
-                return str(value).lower() if value else ""
-        
-        # Sort items with converted values
-        items.sort(key=lambda x: convert_value(x[0]), reverse=self.sort_direction[col])
-        
-        # Toggle sort direction for next click
-        self.sort_direction[col] = not self.sort_direction[col]
-        
-        # Rearrange items in sorted positions
-        for index, (_, item) in enumerate(items):
-            self.tree.move(item, '', index)
+    def db_order(self):
+        # Current sort as livros columns, ID when nothing was clicked yet
+        return [(COLUMN_MAP[col], desc) for col, desc in self.sort_order] or [("id", False)]
+
+    def on_heading_shift_click(self, event):
+        if self.tree.identify_region(event.x, event.y) != "heading":
+            return None
+        column = self.tree.identify_column(event.x)
+        self.sort_treeview(self.tree['columns'][int(column[1:]) - 1], extend=True)
+        return "break"
+
+    @metrics.timed_action("sort_treeview")
+    def sort_treeview(self, col, extend=False):
+        previous = self.sort_order
+        columns = [c for c, _ in previous]
+        if extend and col in columns:
+            # Shift-click on a sorted column flips only that column
+            order = [(c, not d if c == col else d) for c, d in previous]
+        elif extend:
+            order = previous + [(col, False)]
+        elif columns == [col]:
+            order = [(col, not previous[0][1])]
+        else:
+            order = [(col, False)]
+        self.sort_order = order
+        
+        source = self.table.source
+        if len(order) == 1 and columns == [col]:
+            # Same single column in the other direction: the loaded rows are
+            # just read backwards, no query or sort is needed
+            self.table.reverse()
+        else:
+            # Rows live in SQLite: ORDER BY on the indexed columns
+            self.table.set_source(QuerySource(self.repo, filters=source.filters,
+                                              order=self.db_order(), name=source.name))
         
-        # Update column header to show sort direction
+        self.update_sort_headings()
+
+    def update_sort_headings(self):
+        # Show the sort direction, and the sort position for multi-column sorts
+        positions = {col: (i, desc) for i, (col, desc) in enumerate(self.sort_order)}
         for column in self.tree['columns']:
-            if column == col:
-                direction = "↓" if self.sort_direction[col] else "↑"
-                self.tree.heading(column, text=f"{column} {direction}")
-            else:
+            if column not in positions:
                 self.tree.heading(column, text=column)
+                continue
+            i, desc = positions[column]
+            direction = "↓" if desc else "↑"
+            rank = f"{i + 1}" if len(self.sort_order) > 1 else ""
+            self.tree.heading(column, text=f"{column} {direction}{rank}")
+
+class Splash:
+    """Borderless window shown while the collection is opened."""
+    
+    def __init__(self, root):
+        self.window = ttk.Toplevel(root)
+        self.window.overrideredirect(True)
+        frame = ttk.Frame(self.window, padding=30)
+        frame.pack(fill=BOTH, expand=YES)
+        ttk.Label(frame, text="Gerenciador de Coleção de Livros",
+                  font=("Helvetica", 14, "bold")).pack(pady=(0, 10))
+        ttk.Label(frame, text="Carregando a coleção...").pack()
+        self.progress = ttk.Progressbar(frame, mode="indeterminate", length=260)
+        self.progress.pack(pady=(15, 0))
+        self.progress.start(15)
+        
+        # Center on the screen
+        self.window.update_idletasks()
+        width, height = self.window.winfo_reqwidth(), self.window.winfo_reqheight()
+        x = (self.window.winfo_screenwidth() - width) // 2
+        y = (self.window.winfo_screenheight() - height) // 2
+        self.window.geometry(f"{width}x{height}+{x}+{y}")
+    
+    def close(self):
+        self.progress.stop()
+        self.window.destroy()
+
+
+def open_collection(db_path):
+    # Runs on a worker thread: schema migrations and the first reads, so
+    # the page cache is warm by the time the window asks for its rows
+    repo = BookRepository(ConnectionPool(db_path))
+    repo.init_schema()
+    repo.summary()
+    repo.fetch_window(PAGE_SIZE, 0, [("id", False)])
+    return repo
+
+
+def launch(root, args, startup):
+    # Splash first, then build the main window once the data is ready
+    root.withdraw()
+    splash = Splash(root)
+    root.update()
+    startup.mark("splash")
+    
+    registry = CollectionRegistry(args.db)
+    db_path = registry.path(args.collection)
+    if db_path is None:
+        splash.close()
+        messagebox.showerror("Erro", f"Coleção não encontrada: {args.collection}")
+        root.destroy()
+        return
+    
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(open_collection, db_path)
+    executor.shutdown(wait=False)
+    
+    def poll():
+        if not future.done():
+            root.after(10, poll)
+            return
+        startup.mark("first_query")
+        splash.close()
+        try:
+            repo = future.result()
+        except Exception as e:
+            logger.exception("Erro ao abrir a base de dados: %s", e)
+            messagebox.showerror("Erro", f"Erro ao abrir a base de dados: {str(e)}")
+            root.destroy()
+            return
+        
+        BookCollectionApp(root, db_path=db_path, debug=args.debug, repo=repo, registry=registry,
+                          collection=args.collection)
+        startup.mark("main_window")
+        root.deiconify()
+        root.update()
+        startup.mark("first_paint")
+        
+        if args.startup_profile is not None:
+            logger.info("Tempo de inicialização:\n%s", startup.report())
+            if args.startup_profile:
+                with open(args.startup_profile, "w", encoding="utf-8") as f:
+                    json.dump(startup.as_dict(), f, indent=2)
+        if args.exit_after_start:
+            root.destroy()
+    
+    root.after(10, poll)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerenciador de Coleção de Livros")
+    parser.add_argument("--db", help="arquivo SQLite (padrão: LIVROS_DB ou livros.db)")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, metavar="NOME",
+                        help="coleção a abrir; as outras ficam em LIVROS_COLLECTIONS_DIR "
+                             f"(padrão: {DEFAULT_COLLECTION}, que é o arquivo de --db)")
+    parser.add_argument("--debug", action="store_true",
+                        help="mostra a latência da pesquisa numa barra de estado")
+    parser.add_argument("--metrics", metavar="ARQUIVO",
+                        help="mede ações e SQL e grava as métricas (formato Prometheus) ao sair")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="grava um perfil cProfile por ação neste diretório")
+    parser.add_argument("--startup-profile", nargs="?", const="", metavar="ARQUIVO",
+                        help="mostra o tempo de cada fase da inicialização "
+                             "e, com ARQUIVO, grava-o em JSON")
+    parser.add_argument("--exit-after-start", action="store_true",
+                        help="fecha depois de mostrar a janela (para medir a inicialização)")
+    args = parser.parse_args()
+    startup = metrics.StartupProfile(STARTED)
+    startup.mark("imports")
+    
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Must happen before the first connection is opened
+    metrics.configure(metrics=True if args.metrics else None, profile=args.profile)
+    
     root = ttk.Window(themename="cosmo")
-    app = BookCollectionApp(root)
-    root.mainloop() 
\ No newline at end of file
+    startup.mark("window")
+    launch(root, args, startup)
+    root.mainloop()
+    
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.render()) 
\ No newline at end of file
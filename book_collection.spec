@@ -1,41 +1,83 @@
-# -*- mode: python ; coding: utf-8 -*-
-
-a = Analysis(
-    ['book_collection.py'],
-    pathex=[],
-    binaries=[],
-    datas=[
-        ('books.db', '.'),     # Include books.db in the root of the dist folder
-        ('livros.db', '.'),    # Include livros.db in the root of the dist folder
-    ],
-    hiddenimports=[],
-    hookspath=[],
-    hooksconfig={},
-    runtime_hooks=[],
-    excludes=[],
-    noarchive=False,
-    optimize=0,
-)
-
-pyz = PYZ(a.pure)
-
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='book_collection',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=True,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+# -*- mode: python ; coding: utf-8 -*-
+#
+# pyinstaller book_collection.spec              one-file exe (single download)
+# pyinstaller book_collection.spec -- --onedir  dist/book_collection/ folder
+#
+# A one-file exe unpacks itself to a temporary directory on every launch;
+# the one-dir build starts straight from its folder and is the fast-start
+# option. UPX is left off there too, compressed DLLs are inflated at load.
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--onedir', action='store_true')
+options = parser.parse_args()
+
+a = Analysis(
+    ['book_collection.py'],
+    pathex=[],
+    binaries=[],
+    datas=[
+        ('books.db', '.'),     # Include books.db in the root of the dist folder
+        ('livros.db', '.'),    # Include livros.db in the root of the dist folder
+    ],
+    # importer is imported lazily in import_excel, name it for the analysis
+    hiddenimports=['importer'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    # Optional pandas dependencies the desktop app never uses
+    excludes=['matplotlib', 'IPython', 'scipy', 'pytest', 'flask', 'uvicorn'],
+    noarchive=False,
+    optimize=0,
+)
+
+pyz = PYZ(a.pure)
+
+if options.onedir:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='book_collection',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='book_collection',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='book_collection',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
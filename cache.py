@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = int(os.environ.get('LIVROS_CACHE_ENTRIES', 512))
+CACHE_MAX_BYTES = int(os.environ.get('LIVROS_CACHE_MB', 32)) * 1024 * 1024
+
+
+class CachedResponse:
+    """Encoded body of a read endpoint, with an ETag derived from its content."""
+
+    __slots__ = ('body', 'mimetype', 'etag')
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of read responses, bounded by entry count and total body size.
+
+    Every write bumps the data version, which empties the cache. A response
+    computed under an older version is never stored, so a read racing a write
+    can't put stale data back.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._observed = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """Record a write: advance the data version and drop every entry."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._bytes = 0
+            return self.version
+
+    def observe(self, token):
+        """Bump when a database change token differs from the last one seen.
+
+        Covers writes the process did not make itself, e.g. by another
+        worker process or the desktop app.
+        """
+        with self._lock:
+            changed = self._observed is not None and token != self._observed
+            self._observed = token
+        if changed:
+            self.bump()
+        return changed
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, entry):
+        size = len(entry.body)
+        with self._lock:
+            if version != self.version or size > self.max_bytes:
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = entry
+            self._bytes += size
+            # Evict least recently used entries until both limits hold
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self.evictions += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
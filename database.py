@@ -0,0 +1,958 @@
+import base64
+import json
+import math
+import operator
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+import weakref
+from contextlib import contextmanager
+
+import metrics
+import migrations
+from migrations import nome_key
+
+# Default database file, overridable with the LIVROS_DB environment variable
+DEFAULT_DB_PATH = 'livros.db'
+
+BOOK_COLUMNS = ('id', 'nome', 'num_livros', 'valor_euros', 'livros_faltantes',
+                'total_livros', 'preco_medio')
+
+# Columns stored in livros and written by INSERT_SQL / UPDATE_SQL, in
+# parameter order. total_livros and preco_medio are generated columns and
+# valor_euros is stored as integer cents (see migrations.py).
+WRITABLE_COLUMNS = ('nome', 'num_livros', 'valor_euros', 'livros_faltantes')
+
+# Columns that can be used to sort listings; each one has a (column, id)
+# index so keyset pagination never needs an OFFSET scan
+SORTABLE_COLUMNS = BOOK_COLUMNS
+
+# Typed columns that accept range filters, backed by the same indexes
+NUMERIC_COLUMNS = {
+    'num_livros': int,
+    'valor_euros': float,
+    'livros_faltantes': int,
+    'total_livros': int,
+    'preco_medio': float,
+}
+
+FILTER_SUFFIXES = {'': '=', '_min': '>=', '_max': '<='}
+FILTER_OPERATORS = {
+    '=': operator.eq,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+EXPORT_BATCH_SIZE = 5000
+
+# Batch CRUD: operations per request, and per transaction when applying them
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+MAX_BATCH_OPERATIONS = 100000
+BATCH_CHUNK_SIZE = 5000
+
+# Delta sync: changes per response, and how long tombstones are kept
+DEFAULT_CHANGES_LIMIT = 1000
+MAX_CHANGES_LIMIT = 10000
+CHANGES_RETENTION_DAYS = float(os.environ.get('LIVROS_CHANGES_RETENTION_DAYS', '30'))
+
+# Pragmas applied once to every pooled connection
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+)
+
+# SQL is kept in module constants so sqlite3's statement cache always sees
+# the exact same string and reuses the prepared statement
+SELECT_ALL_SQL = f"SELECT {', '.join(BOOK_COLUMNS)} FROM livros"
+
+SELECT_ONE_SQL = SELECT_ALL_SQL + " WHERE id=?"
+
+# Values follow WRITABLE_COLUMNS; valor_euros is converted to cents and the
+# name key (migration 5) derived here so every caller keeps passing the
+# same four values
+INSERT_SQL = '''
+    INSERT INTO livros (nome, nome_key, num_livros, valor_cents, livros_faltantes)
+    VALUES (?1, nome_key(?1), COALESCE(?2, 0), CAST(round(COALESCE(?3, 0) * 100) AS INTEGER),
+            COALESCE(?4, 0))
+'''
+
+UPDATE_SQL = '''
+    UPDATE livros
+    SET nome=?1, nome_key=nome_key(?1), num_livros=COALESCE(?2, 0),
+        valor_cents=CAST(round(COALESCE(?3, 0) * 100) AS INTEGER),
+        livros_faltantes=COALESCE(?4, 0)
+    WHERE id=?5
+'''
+
+# Imports pass the content hash and the name key they already computed
+# after the writable columns (the id comes last in the update)
+HASHED_INSERT_SQL = '''
+    INSERT INTO livros (nome, nome_key, num_livros, valor_cents, livros_faltantes, content_hash)
+    VALUES (?1, ?6, COALESCE(?2, 0), CAST(round(COALESCE(?3, 0) * 100) AS INTEGER),
+            COALESCE(?4, 0), ?5)
+'''
+
+HASHED_UPDATE_SQL = '''
+    UPDATE livros
+    SET nome=?1, nome_key=?6, num_livros=COALESCE(?2, 0),
+        valor_cents=CAST(round(COALESCE(?3, 0) * 100) AS INTEGER),
+        livros_faltantes=COALESCE(?4, 0), content_hash=?5
+    WHERE id=?7
+'''
+
+SET_HASH_SQL = "UPDATE livros SET content_hash=? WHERE id=?"
+
+# Stored rows for a chunk of name keys; the values let an upsert hash rows
+# that have no content_hash yet
+KEYED_ROWS_SQL = '''
+    SELECT nome_key, id, content_hash, nome, num_livros, valor_cents, livros_faltantes
+    FROM livros WHERE nome_key IN ({0})
+'''
+
+IDS_UP_TO_SQL = "SELECT id FROM livros WHERE id <= ?"
+
+DELETE_SQL = "DELETE FROM livros WHERE id=?"
+
+DATA_VERSION_SQL = "PRAGMA data_version"
+
+LAST_ROWID_SQL = "SELECT last_insert_rowid()"
+
+# Existence check for a run of batch updates or deletes; SQLite's default
+# limit on bound parameters is 999
+EXISTING_IDS_SQL = "SELECT id FROM livros WHERE id IN ({0})"
+EXISTING_IDS_CHUNK = 500
+KEYS_CHUNK = 500
+
+# Bulk inserts (see migration 4 in migrations.py). With AUTOINCREMENT the
+# rows above the sequence value read before the insert are exactly the new
+# ones, so the trigger work is redone once for that id range.
+BULK_LOAD_ON_SQL = "INSERT INTO livros_bulk_load (active) VALUES (1)"
+BULK_LOAD_OFF_SQL = "DELETE FROM livros_bulk_load"
+SEQUENCE_SQL = "SELECT seq FROM sqlite_sequence WHERE name = 'livros'"
+BULK_SUMMARY_SQL = '''
+    UPDATE livros_summary SET
+        (row_count, total_books, total_cents, missing_books, price_sum, price_count) = (
+            SELECT livros_summary.row_count + COUNT(*),
+                   livros_summary.total_books + COALESCE(SUM(total_livros), 0),
+                   livros_summary.total_cents + COALESCE(SUM(valor_cents), 0),
+                   livros_summary.missing_books + COALESCE(SUM(livros_faltantes), 0),
+                   livros_summary.price_sum + COALESCE(SUM(preco_medio), 0),
+                   livros_summary.price_count + COUNT(*)
+            FROM livros WHERE id > ?)
+    WHERE id = 1
+'''
+BULK_FTS_SQL = "INSERT INTO livros_fts(rowid, nome) SELECT id, nome FROM livros WHERE id > ?"
+BULK_CHANGES_SQL = "INSERT INTO livros_changes (book_id) SELECT id FROM livros WHERE id > ? ORDER BY id"
+
+CHANGES_VERSION_SQL = "SELECT seq FROM sqlite_sequence WHERE name = 'livros_changes'"
+
+# Latest state of every book changed after a version; deleted books have no row
+CHANGES_SQL = f'''
+    SELECT c.version, c.book_id, c.deleted, {', '.join('l.' + column for column in BOOK_COLUMNS)}
+    FROM livros_changes c LEFT JOIN livros l ON l.id = c.book_id
+    WHERE c.version > ?
+    ORDER BY c.version
+    LIMIT ?
+'''
+
+# Full-scan aggregates, only used to seed and verify livros_summary
+FULL_SUMMARY_SQL = '''
+    SELECT
+        SUM(total_livros) as total_books,
+        SUM(valor_cents) / 100.0 as total_value,
+        AVG(preco_medio) as avg_price,
+        SUM(livros_faltantes) as missing_books
+    FROM livros
+'''
+
+# livros_summary is a single-row table kept up to date by triggers, so
+# reading the summary is O(1); AVG(preco_medio) is price_sum / price_count
+SEED_SUMMARY_SQL = '''
+    INSERT OR REPLACE INTO livros_summary
+    SELECT 1, COUNT(*), COALESCE(SUM(total_livros), 0), COALESCE(SUM(valor_cents), 0),
+           COALESCE(SUM(livros_faltantes), 0), COALESCE(SUM(preco_medio), 0),
+           COUNT(preco_medio)
+    FROM livros
+'''
+
+SUMMARY_SQL = '''
+    SELECT
+        CASE WHEN row_count THEN total_books END,
+        CASE WHEN row_count THEN total_cents / 100.0 END,
+        CASE WHEN price_count THEN price_sum / price_count END,
+        CASE WHEN row_count THEN missing_books END
+    FROM livros_summary WHERE id = 1
+'''
+
+SEARCH_FTS_SQL = f'''
+    SELECT {', '.join('livros.' + c for c in BOOK_COLUMNS)}
+    FROM livros_fts JOIN livros ON livros.id = livros_fts.rowid
+    WHERE livros_fts MATCH ?
+    ORDER BY livros_fts.rank
+    LIMIT ?
+'''
+
+# search_names without FTS5: substring matches, names starting with the
+# text first, bounded in SQL like SEARCH_FTS_SQL
+SEARCH_LIKE_SQL = f'''
+    {SELECT_ALL_SQL}
+    WHERE LOWER(nome) LIKE ?1
+    ORDER BY LOWER(nome) NOT LIKE ?2, nome, id
+    LIMIT ?3
+'''
+
+# Windows of a name search in relevance order, for the desktop table
+SEARCH_WINDOW_SQL = f'''
+    SELECT {', '.join('livros.' + c for c in BOOK_COLUMNS)}
+    FROM livros_fts JOIN livros ON livros.id = livros_fts.rowid
+    WHERE livros_fts MATCH ? {{filters}}
+    ORDER BY livros_fts.rank
+    LIMIT ? OFFSET ?
+'''
+
+# Raw counters behind SUMMARY_SQL, which add up across collections
+SUMMARY_TOTALS_SQL = '''
+    SELECT row_count, total_books, total_cents, missing_books, price_sum, price_count
+    FROM livros_summary WHERE id = 1
+'''
+
+DEFAULT_SEARCH_LIMIT = 100
+
+# Relative tolerance when comparing float sums kept incrementally with a scan
+SUMMARY_TOLERANCE = 1e-9
+
+
+class ChangesExpired(Exception):
+    """The requested version is older than the compacted part of the change log."""
+
+
+class DuplicateName(ValueError):
+    """Another book already has the same name (compared by nome_key)."""
+
+    def __init__(self):
+        super().__init__('Já existe um livro com este nome')
+
+
+def _integrity_error(error):
+    # UNIQUE constraint failed: livros.nome_key
+    return DuplicateName() if 'nome_key' in str(error) else error
+
+
+def register_functions(conn):
+    """SQL functions the statements above rely on."""
+    conn.create_function('nome_key', 1, nome_key, deterministic=True)
+
+
+def get_db_path():
+    return os.environ.get('LIVROS_DB', DEFAULT_DB_PATH)
+
+
+class _Checkout:
+    """A thread's hold on a pooled connection; collected when the thread ends."""
+
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """Hands out one long-lived SQLite connection per thread.
+
+    When a thread ends its connection goes back to the pool for the next
+    new thread, so servers that start a thread per request (Werkzeug's
+    threaded dev server) reuse connections instead of opening one per
+    request. At most max_idle unused connections are kept open.
+    """
+
+    def __init__(self, db_path=None, cached_statements=256, max_idle=8):
+        self.db_path = db_path or get_db_path()
+        self.cached_statements = cached_statements
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._idle = []
+        self._generation = 0
+        self._watcher = None
+
+    def _connect(self):
+        # With metrics on, every statement is timed through metrics.TimedCursor
+        conn = sqlite3.connect(self.db_path, cached_statements=self.cached_statements,
+                               check_same_thread=False, factory=metrics.connection_factory())
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        register_functions(conn)
+        return conn
+
+    def connection(self):
+        checkout = getattr(self._local, 'checkout', None)
+        if checkout is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+                generation = self._generation
+            if conn is None:
+                conn = self._connect()
+                with self._lock:
+                    self._connections.append(conn)
+                    generation = self._generation
+            checkout = _Checkout(conn)
+            # Runs when the thread's locals are dropped, i.e. when it ends
+            weakref.finalize(checkout, self._release, conn, generation).atexit = False
+            self._local.checkout = checkout
+        return checkout.conn
+
+    def _release(self, conn, generation):
+        with self._lock:
+            if generation != self._generation:
+                return  # closed by close_all()
+            if not conn.in_transaction and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._connections.remove(conn)
+        conn.close()
+
+    def open_connections(self):
+        """Connections currently open, in use or idle."""
+        with self._lock:
+            return len(self._connections)
+
+    def data_version(self):
+        """PRAGMA data_version of a dedicated connection.
+
+        It changes whenever any other connection commits, including other
+        threads, other worker processes and the desktop app.
+        """
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = sqlite3.connect(self.db_path, check_same_thread=False)
+            return self._watcher.execute(DATA_VERSION_SQL).fetchone()[0]
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._idle.clear()
+            self._generation += 1
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+        self._local = threading.local()
+
+
+class BookRepository:
+    """Data access for the livros table, shared by app.py and the desktop app."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._has_fts = None
+
+    @property
+    def db_path(self):
+        return self.pool.db_path
+
+    def connection(self):
+        return self.pool.connection()
+
+    def data_version(self):
+        return self.pool.data_version()
+
+    def init_schema(self):
+        """Create or upgrade the schema; see migrations.py."""
+        conn = self.connection()
+        migrations.migrate(conn, self.db_path)
+        # Without FTS5 (see migrations.py) name search falls back to LIKE
+        self._has_fts = None
+
+    @property
+    def has_fts(self):
+        if self._has_fts is None:
+            self._has_fts = self.connection().execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'livros_fts'").fetchone() is not None
+        return self._has_fts
+
+    def list_books(self, filters=None):
+        where, params = _where([_filter_condition(filters)])
+        return self.connection().execute(f"{SELECT_ALL_SQL} {where}", params).fetchall()
+
+    def list_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, sort='id',
+                  descending=False, fields=None, filters=None):
+        """Return one page of books and the cursor for the next page.
+
+        Pagination is keyset based on (sort column, id), so every page costs
+        the same no matter how deep into the table it is.
+        """
+        if sort not in SORTABLE_COLUMNS:
+            raise ValueError(f"Coluna de ordenação inválida: {sort}")
+        fields = list(fields or BOOK_COLUMNS)
+        unknown = [field for field in fields if field not in BOOK_COLUMNS]
+        if unknown:
+            raise ValueError(f"Campos inválidos: {', '.join(unknown)}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        # id and the sort column are always fetched to build the next cursor
+        selected = list(dict.fromkeys(['id', sort] + fields))
+        where, params = _where([_keyset_condition(sort, descending, cursor),
+                                _filter_condition(filters)])
+        direction = 'DESC' if descending else 'ASC'
+        order = f"id {direction}" if sort == 'id' else f"{sort} {direction}, id {direction}"
+        query = f"SELECT {', '.join(selected)} FROM livros {where} ORDER BY {order} LIMIT ?"
+        rows = self.connection().execute(query, (*params, limit + 1)).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = dict(zip(selected, rows[-1]))
+            next_cursor = encode_cursor(last[sort], last['id'])
+        positions = [(field, selected.index(field)) for field in fields]
+        books = [{field: row[i] for field, i in positions} for row in rows]
+        return books, next_cursor
+
+    def _name_condition(self, name):
+        # Rows search_names(name) would return, as a condition on livros
+        if name is None:
+            return None, ()
+        if not self.has_fts:
+            return "LOWER(nome) LIKE ?", (f'%{name.lower()}%',)
+        query = fts_query(name)
+        if not query:
+            return "0", ()
+        return "id IN (SELECT rowid FROM livros_fts WHERE livros_fts MATCH ?)", (query,)
+
+    def fetch_window(self, limit, offset=0, order=(('id', False),), filters=None,
+                     after=None, name=None):
+        """Full rows for windowed views, sorted by order.
+
+        order is a list of (column, descending) pairs, with id as the final
+        tie-breaker. For single-column orders, after may give the (sort value,
+        id) of the row just before the window, which turns the OFFSET scan
+        into an index seek. name restricts the rows to a name search; with
+        an empty order they come in relevance order, as from search_names.
+        """
+        order = list(order)
+        for column, _ in order:
+            if column not in SORTABLE_COLUMNS:
+                raise ValueError(f"Coluna de ordenação inválida: {column}")
+        if name is not None and not order and self.has_fts:
+            query = fts_query(name)
+            if not query:
+                return []
+            sql, params = _filter_condition(filters)
+            return self.connection().execute(
+                SEARCH_WINDOW_SQL.format(filters=f"AND ({sql})" if sql else ''),
+                (query, *params, limit, offset)).fetchall()
+        conditions = [_filter_condition(filters), self._name_condition(name)]
+        if after is not None:
+            if len(order) != 1:
+                raise ValueError("after só é suportado com uma coluna de ordenação")
+            conditions.append(_after_condition(order[0][0], order[0][1], *after))
+            offset = 0
+        where, params = _where(conditions)
+        query = f"{SELECT_ALL_SQL} {where} ORDER BY {order_clause(order)} LIMIT ? OFFSET ?"
+        return self.connection().execute(query, (*params, limit, offset)).fetchall()
+
+    def count_books(self, filters=None, name=None):
+        if not filters and name is None:
+            # Maintained by the summary triggers, no scan needed
+            return self.connection().execute(
+                "SELECT row_count FROM livros_summary WHERE id = 1").fetchone()[0]
+        where, params = _where([_filter_condition(filters), self._name_condition(name)])
+        return self.connection().execute(
+            f"SELECT COUNT(*) FROM livros {where}", params).fetchone()[0]
+
+    def filtered_totals(self, filters=None, name=None):
+        """(total_livros, valor_euros, livros_faltantes) sums over matching rows."""
+        where, params = _where([_filter_condition(filters), self._name_condition(name)])
+        return self.connection().execute(
+            "SELECT SUM(total_livros), SUM(valor_cents) / 100.0, SUM(livros_faltantes) "
+            f"FROM livros {where}",
+            params).fetchone()
+
+    def iter_batches(self, batch_size=EXPORT_BATCH_SIZE):
+        """Yield the whole table in fetchmany batches of at most batch_size rows."""
+        # A dedicated cursor so other statements on this connection don't reset it
+        cursor = self.connection().cursor()
+        cursor.execute(SELECT_ALL_SQL)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def get_book(self, book_id):
+        return self.connection().execute(SELECT_ONE_SQL, (book_id,)).fetchone()
+
+    def add_book(self, values):
+        """Insert one book; raises DuplicateName if the name is taken."""
+        conn = self.connection()
+        try:
+            with conn:
+                cursor = conn.execute(INSERT_SQL, values)
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(e) from e
+        return cursor.lastrowid
+
+    def insert_many(self, rows):
+        """Insert an iterable of value tuples in a single transaction."""
+        conn = self.connection()
+        with conn:
+            return self.bulk_insert(conn, rows)
+
+    def bulk_insert(self, conn, rows, sql=INSERT_SQL):
+        """executemany(sql), INSERT_SQL by default, inside the caller's transaction.
+
+        The per-row summary, FTS and change-log triggers are switched off
+        for the statement and their work is done afterwards in one set-based
+        statement each, which is several times faster for large batches.
+        """
+        conn.execute(BULK_LOAD_ON_SQL)
+        sequence = conn.execute(SEQUENCE_SQL).fetchone()
+        after = sequence[0] if sequence else 0
+        count = conn.executemany(sql, rows).rowcount
+        conn.execute(BULK_SUMMARY_SQL, (after,))
+        if self.has_fts:
+            conn.execute(BULK_FTS_SQL, (after,))
+        conn.execute(BULK_CHANGES_SQL, (after,))
+        conn.execute(BULK_LOAD_OFF_SQL)
+        return count
+
+    def update_hashed(self, conn, updates, hashes=()):
+        """executemany(HASHED_UPDATE_SQL) and store the content hash of
+        unchanged rows, inside the caller's transaction."""
+        if updates:
+            conn.executemany(HASHED_UPDATE_SQL, updates)
+        if hashes:
+            conn.executemany(SET_HASH_SQL, hashes)
+
+    @contextmanager
+    def write_transaction(self):
+        """A transaction holding the write lock from its first statement, so
+        what it reads can't be changed by another writer before it commits."""
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+    def rows_by_key(self, keys):
+        """{nome_key: (id, content_hash, nome, num_livros, valor_cents, livros_faltantes)}
+        for the stored books with one of the given keys."""
+        conn = self.connection()
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), KEYS_CHUNK):
+            chunk = keys[start:start + KEYS_CHUNK]
+            sql = KEYED_ROWS_SQL.format(', '.join('?' * len(chunk)))
+            found.update((row[0], row[1:]) for row in conn.execute(sql, chunk))
+        return found
+
+    def last_id(self):
+        """Highest id ever assigned; later inserts get larger ones."""
+        sequence = self.connection().execute(SEQUENCE_SQL).fetchone()
+        return sequence[0] if sequence else 0
+
+    def delete_missing(self, keep, last_id):
+        """Delete the books up to last_id whose id is not in keep; returns
+        how many were deleted."""
+        keep = set(keep)
+        conn = self.connection()
+        with conn:
+            missing = [row for row in conn.execute(IDS_UP_TO_SQL, (last_id,))
+                       if row[0] not in keep]
+            conn.executemany(DELETE_SQL, missing)
+        return len(missing)
+
+    def update_book(self, book_id, values):
+        conn = self.connection()
+        try:
+            with conn:
+                cursor = conn.execute(UPDATE_SQL, (*values, book_id))
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(e) from e
+        return cursor.rowcount
+
+    def delete_book(self, book_id):
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(DELETE_SQL, (book_id,))
+        return cursor.rowcount
+
+    def apply_operations(self, operations):
+        """Apply parsed batch operations in one transaction, in order.
+
+        Consecutive operations of the same kind go through a single
+        executemany. Returns (id, status) per operation, where status is
+        created, updated, deleted or not_found. A name that is already
+        taken raises DuplicateName and nothing in the chunk is applied.
+        """
+        try:
+            return self._apply_operations(operations)
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(e) from e
+
+    def _apply_operations(self, operations):
+        results = []
+        conn = self.connection()
+        with conn:
+            for kind, run in _runs(operations):
+                if kind == 'create':
+                    rows = [values for _, _, values in run]
+                    conn.executemany(INSERT_SQL, rows)
+                    # Rowids of a single-statement batch inside one write
+                    # transaction are consecutive, ending at the last one
+                    last_id = conn.execute(LAST_ROWID_SQL).fetchone()[0]
+                    first_id = last_id - len(rows) + 1
+                    results.extend((first_id + i, 'created') for i in range(len(rows)))
+                    continue
+
+                existing = _existing_ids(conn, {book_id for _, book_id, _ in run})
+                applied = []
+                for _, book_id, values in run:
+                    if book_id in existing:
+                        applied.append((*values, book_id) if kind == 'update' else (book_id,))
+                        results.append((book_id, kind + 'd'))
+                        if kind == 'delete':
+                            existing.discard(book_id)
+                    else:
+                        results.append((book_id, 'not_found'))
+                conn.executemany(UPDATE_SQL if kind == 'update' else DELETE_SQL, applied)
+        return results
+
+    def changes_version(self):
+        """Version of the latest change, 0 before the first one."""
+        row = self.connection().execute(CHANGES_VERSION_SQL).fetchone()
+        return row[0] if row else 0
+
+    def changes_since(self, since, limit=DEFAULT_CHANGES_LIMIT):
+        """Changes after version `since`, oldest first, at most limit of them.
+
+        Returns (changes, next_version, has_more). Every book appears once,
+        with its current row or as a tombstone (book None). Pass
+        next_version back as `since` to continue. since=0 fetches the whole
+        collection; any other version older than the compacted tombstones
+        raises ChangesExpired and the client has to start again from 0.
+        """
+        limit = max(1, min(int(limit), MAX_CHANGES_LIMIT))
+        conn = self.connection()
+        # Read before the rows: anything committed in between is in them
+        version = self.changes_version()
+        purged = conn.execute("SELECT purged_through FROM livros_changes_state").fetchone()[0]
+        if since < 0 or since > version or 0 < since < purged:
+            raise ChangesExpired(since)
+
+        rows = conn.execute(CHANGES_SQL, (since, limit + 1)).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        changes = [(row[0], row[1], None if row[2] else row[3:]) for row in rows]
+        if has_more:
+            next_version = rows[-1][0]
+        else:
+            next_version = max(version, rows[-1][0]) if rows else version
+        return changes, next_version, has_more
+
+    def compact_changes(self, retention_days=CHANGES_RETENTION_DAYS):
+        """Drop tombstones older than retention_days; returns how many went."""
+        conn = self.connection()
+        with conn:
+            horizon = conn.execute(
+                "SELECT MAX(version) FROM livros_changes WHERE deleted "
+                "AND changed_at < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+                (int(retention_days * 86400),)).fetchone()[0]
+            if horizon is None:
+                return 0
+            cursor = conn.execute(
+                "DELETE FROM livros_changes WHERE deleted AND version <= ?", (horizon,))
+            conn.execute("UPDATE livros_changes_state "
+                         "SET purged_through = MAX(purged_through, ?)", (horizon,))
+        return cursor.rowcount
+
+    def summary(self):
+        """(total_books, total_value, avg_price, missing_books), read in O(1)."""
+        return self.connection().execute(SUMMARY_SQL).fetchone()
+
+    def summary_totals(self):
+        """(row_count, total_books, total_cents, missing_books, price_sum, price_count)."""
+        return self.connection().execute(SUMMARY_TOTALS_SQL).fetchone()
+
+    def verify_summary(self, repair=True):
+        """Compare livros_summary with a full scan, rebuilding it on mismatch."""
+        conn = self.connection()
+        with conn:
+            stored = conn.execute(SUMMARY_SQL).fetchone()
+            scanned = conn.execute(FULL_SUMMARY_SQL).fetchone()
+            consistent = all(
+                a == b or (a is not None and b is not None and
+                           abs(a - b) <= SUMMARY_TOLERANCE * max(abs(a), abs(b), 1))
+                for a, b in zip(stored, scanned)
+            )
+            if not consistent and repair:
+                conn.execute(SEED_SUMMARY_SQL)
+        return {
+            'consistent': consistent,
+            'repaired': not consistent and repair,
+            'stored': stored,
+            'scanned': scanned,
+        }
+
+    def search_names(self, text, limit=DEFAULT_SEARCH_LIMIT):
+        """Ranked, accent-insensitive prefix search on nome (limit None = all)."""
+        query = fts_query(text)
+        if not query:
+            return []
+        limit = -1 if limit is None else limit
+        if not self.has_fts:
+            text = text.lower()
+            return self.connection().execute(
+                SEARCH_LIKE_SQL, (f'%{text}%', f'{text}%', limit)).fetchall()
+        return self.connection().execute(
+            SEARCH_FTS_SQL, (query, limit)).fetchall()
+
+    def name_matches(self, text, nome):
+        """Whether a book named nome is returned by search_names(text).
+
+        Decided from the name alone, so it also holds for a row as it was
+        before an edit.
+        """
+        if not fts_query(text):
+            return False
+        if not self.has_fts:
+            return text.lower() in str(nome).lower()
+        words = fts_tokens(str(nome))
+        return all(any(word.startswith(term) for word in words) for term in fts_tokens(text))
+
+
+def book_to_dict(book):
+    return dict(zip(BOOK_COLUMNS, book))
+
+
+def fts_tokens(text):
+    """Words of text as the FTS5 unicode61 tokenizer indexes them (see
+    migrations.py): letters and digits only, lower case, no diacritics."""
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(value, book_id):
+    raw = json.dumps([value, book_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        value, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return value, int(book_id)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+
+
+def _keyset_condition(sort, descending, cursor):
+    if cursor is None:
+        return None, ()
+    return _after_condition(sort, descending, *decode_cursor(cursor))
+
+
+def _after_condition(sort, descending, value, book_id):
+    op = '<' if descending else '>'
+    if sort == 'id':
+        return f"id {op} ?", (book_id,)
+    # SQLite orders NULLs first, so they open an ascending listing and close
+    # a descending one
+    if value is None:
+        if descending:
+            return f"{sort} IS NULL AND id < ?", (book_id,)
+        return f"({sort} IS NULL AND id > ?) OR {sort} IS NOT NULL", (book_id,)
+    condition = f"{sort} {op} ? OR ({sort} = ? AND id {op} ?)"
+    if descending:
+        condition += f" OR {sort} IS NULL"
+    return condition, (value, value, book_id)
+
+
+def parse_filters(params):
+    """Build typed filters from a mapping such as request.args.
+
+    Accepts <column>=v for equality and <column>_min / <column>_max for
+    inclusive ranges on the numeric columns. Returns (column, op, value)
+    tuples; raises ValueError on values that are not numbers.
+    """
+    filters = []
+    for column, kind in NUMERIC_COLUMNS.items():
+        for suffix, op in FILTER_SUFFIXES.items():
+            raw = params.get(column + suffix)
+            if raw is None or str(raw).strip() == '':
+                continue
+            try:
+                filters.append((column, op, kind(raw)))
+            except ValueError:
+                raise ValueError(f"Valor inválido para {column + suffix}: {raw}")
+    return filters
+
+
+def parse_book(data):
+    """Validate a JSON book object into a value tuple for INSERT_SQL / UPDATE_SQL.
+
+    total_livros and preco_medio are derived by the database, so they are
+    accepted but ignored.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Livro deve ser um objeto")
+    nome = data.get('nome')
+    if not isinstance(nome, str) or not nome.strip():
+        raise ValueError("Campo nome obrigatório")
+    values = [nome.strip()]
+    for column in WRITABLE_COLUMNS[1:]:
+        kind = NUMERIC_COLUMNS[column]
+        if column not in data:
+            raise ValueError(f"Campo {column} obrigatório")
+        value = data[column]
+        if value is None:
+            values.append(None)
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(f"Valor inválido para {column}: {value}")
+        try:
+            if kind is int and isinstance(value, float):
+                if not value.is_integer():
+                    raise ValueError
+                value = int(value)
+            value = kind(value)
+        except ValueError:
+            raise ValueError(f"Valor inválido para {column}: {value}")
+        # float() accepts 'inf', 'nan' and '1e400', which compare false with 0
+        if not math.isfinite(value):
+            raise ValueError(f"Valor inválido para {column}: {value}")
+        if value < 0:
+            raise ValueError(f"Valor negativo para {column}: {value}")
+        values.append(value)
+    return tuple(values)
+
+
+def parse_operations(items):
+    """Validate a batch payload up front.
+
+    Each item is {"op": "create", "book": {...}}, {"op": "update", "id": n,
+    "book": {...}} or {"op": "delete", "id": n}. Returns (operations, errors),
+    with operations as (op, id, values) tuples and errors as {index, error}.
+    """
+    if not isinstance(items, list):
+        raise ValueError("operations deve ser uma lista")
+    if len(items) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"Máximo de {MAX_BATCH_OPERATIONS} operações por lote")
+    operations, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Operação deve ser um objeto")
+            kind = item.get('op')
+            if kind not in BATCH_OPERATIONS:
+                raise ValueError(f"Operação inválida: {kind}")
+            book_id = None
+            if kind != 'create':
+                book_id = item.get('id')
+                if isinstance(book_id, bool) or not isinstance(book_id, int):
+                    raise ValueError("Campo id obrigatório")
+            values = parse_book(item.get('book')) if kind != 'delete' else None
+            operations.append((kind, book_id, values))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    return operations, errors
+
+
+def _runs(operations):
+    # Split operations into consecutive runs of the same kind
+    run = []
+    for operation in operations:
+        if run and operation[0] != run[0][0]:
+            yield run[0][0], run
+            run = []
+        run.append(operation)
+    if run:
+        yield run[0][0], run
+
+
+def _existing_ids(conn, ids):
+    ids = list(ids)
+    existing = set()
+    for start in range(0, len(ids), EXISTING_IDS_CHUNK):
+        chunk = ids[start:start + EXISTING_IDS_CHUNK]
+        sql = EXISTING_IDS_SQL.format(', '.join('?' * len(chunk)))
+        existing.update(row[0] for row in conn.execute(sql, chunk))
+    return existing
+
+
+def parse_numeric_expression(column, text):
+    """Filters for a desktop filter box: '10', '10-20', '10..20', '>5', '<=3'."""
+    kind = NUMERIC_COLUMNS[column]
+    text = text.strip().replace(',', '.')
+    number = r'(-?\d+(?:\.\d+)?)'
+    try:
+        match = re.fullmatch(r'(<=|>=|<|>|=)?\s*' + number, text)
+        if match:
+            return [(column, match.group(1) or '=', kind(match.group(2)))]
+        match = re.fullmatch(number + r'\s*(?:-|\.\.)\s*' + number, text)
+        if match:
+            return [(column, '>=', kind(match.group(1))), (column, '<=', kind(match.group(2)))]
+    except ValueError:
+        pass
+    raise ValueError(f"Filtro numérico inválido: {text}")
+
+
+def row_matches(filters, row):
+    """Evaluate typed filters against a livros row in Python, as SQLite would."""
+    for column, op, value in filters or ():
+        cell = row[BOOK_COLUMNS.index(column)]
+        # NULL never satisfies a comparison in SQL
+        if cell is None or not FILTER_OPERATORS[op](cell, value):
+            return False
+    return True
+
+
+def order_clause(order):
+    """ORDER BY terms for (column, descending) pairs, with id breaking ties."""
+    terms = []
+    for column, descending in order:
+        terms.append(f"{column} {'DESC' if descending else 'ASC'}")
+        # id is unique, nothing after it can change the order
+        if column == 'id':
+            return ', '.join(terms)
+    terms.append(f"id {'DESC' if order and order[0][1] else 'ASC'}")
+    return ', '.join(terms)
+
+
+def _where(conditions):
+    """Combine (sql, params) pairs into one WHERE clause, skipping empty ones."""
+    conditions = [(sql, params) for sql, params in conditions if sql]
+    if not conditions:
+        return '', ()
+    clause = ' AND '.join(f'({sql})' for sql, _ in conditions)
+    return f'WHERE {clause}', tuple(p for _, params in conditions for p in params)
+
+
+def _filter_condition(filters):
+    if not filters:
+        return None, ()
+    for column, op, _ in filters:
+        # Columns and operators are interpolated, so both are whitelisted
+        if column not in NUMERIC_COLUMNS or op not in FILTER_OPERATORS:
+            raise ValueError(f"Filtro inválido: {column} {op}")
+    sql = ' AND '.join(f'{column} {op} ?' for column, op, _ in filters)
+    return sql, tuple(value for _, _, value in filters)
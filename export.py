@@ -0,0 +1,127 @@
+import csv
+import importlib.util
+import io
+import json
+
+from database import BOOK_COLUMNS
+
+# Streaming encoders for the export endpoint. Each one takes an iterator of
+# row batches and yields encoded text chunks, so only one batch is ever held
+# in memory regardless of how large the table is.
+
+
+def ndjson_chunks(batches):
+    for rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(BOOK_COLUMNS, row)), ensure_ascii=False) + '\n'
+            for row in rows
+        )
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(BOOK_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty table
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def json_chunks(batches):
+    yield '['
+    first = True
+    for rows in batches:
+        encoded = ','.join(
+            json.dumps(dict(zip(BOOK_COLUMNS, row)), ensure_ascii=False)
+            for row in rows
+        )
+        yield encoded if first else ',' + encoded
+        first = False
+    yield ']'
+
+
+# Binary columnar formats: each batch becomes one Parquet row group or one
+# Arrow record batch, written to an in-memory sink that is drained after
+# every batch. Only the schema and the footer are held until the end.
+
+ARROW_TYPES = {
+    'id': 'int64',
+    'nome': 'string',
+    'num_livros': 'int64',
+    'valor_euros': 'float64',
+    'livros_faltantes': 'int64',
+    'total_livros': 'int64',
+    'preco_medio': 'float64',
+}
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([(column, ARROW_TYPES[column]) for column in BOOK_COLUMNS])
+
+
+def record_batch(rows, schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema)
+
+
+def _drain(sink):
+    chunk = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return chunk
+
+
+def parquet_chunks(batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in batches:
+            writer.write_table(pa.Table.from_batches([record_batch(rows, schema)]))
+            yield _drain(sink)
+    finally:
+        writer.close()
+    yield _drain(sink)
+
+
+def arrow_chunks(batches):
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    sink = io.BytesIO()
+    # The IPC file format, which can also be read back with random access
+    writer = pa.ipc.new_file(sink, schema)
+    try:
+        for rows in batches:
+            writer.write_batch(record_batch(rows, schema))
+            yield _drain(sink)
+    finally:
+        writer.close()
+    yield _drain(sink)
+
+
+# format -> (encoder, mimetype, file extension)
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson', 'ndjson'),
+    'csv': (csv_chunks, 'text/csv', 'csv'),
+    'json': (json_chunks, 'application/json', 'json'),
+}
+
+# pyarrow is optional; without it the columnar formats are simply not offered
+if importlib.util.find_spec('pyarrow') is not None:
+    EXPORT_FORMATS['parquet'] = (parquet_chunks, 'application/vnd.apache.parquet', 'parquet')
+    EXPORT_FORMATS['arrow'] = (arrow_chunks, 'application/vnd.apache.arrow.file', 'arrow')
@@ -0,0 +1,429 @@
+import os
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from database import HASHED_INSERT_SQL, WRITABLE_COLUMNS
+from migrations import nome_key
+
+# Spreadsheet header -> (livros column, kind). TOTAL LIVROS and PREÇO MÉDIO
+# are derived by the database and ignored on import.
+EXCEL_COLUMNS = {
+    'NOME': ('nome', 'text'),
+    'Nº LIVROS': ('num_livros', 'int'),
+    'VALOR(€)': ('valor_euros', 'float'),
+    'LIVROS EM FALTA': ('livros_faltantes', 'int'),
+    'TOTAL LIVROS': ('total_livros', 'int'),
+    'PREÇO MÉDIO(€)': ('preco_medio', 'float'),
+}
+
+# Rows coerced and inserted per transaction; also bounds streaming memory
+IMPORT_BATCH_SIZE = int(os.environ.get('LIVROS_IMPORT_BATCH_SIZE', 10000))
+
+# Only the first rejections are kept with details, the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+# Spreadsheet row of the first data row (row 1 holds the headers)
+FIRST_DATA_ROW = 2
+
+# File types read in bounded batches instead of one big DataFrame
+STREAMING_EXTENSIONS = ('.xlsx', '.xlsm', '.csv')
+
+# Columnar files, read record batch by record batch with pyarrow
+PARQUET_EXTENSIONS = ('.parquet',)
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+# Files written by the export endpoint, in any format, carry the livros
+# column names; normalize_headers maps them to the spreadsheet headers
+HEADER_FOR_COLUMN = {column: header for header, (column, _) in EXCEL_COLUMNS.items()}
+
+# append inserts every new name; upsert also updates books whose name is
+# already stored and leaves rows whose content hash is unchanged alone
+IMPORT_MODES = ('append', 'upsert')
+
+
+class ImportReport:
+    def __init__(self):
+        self.total_rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, row, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'reason': reason})
+
+    def message(self):
+        message = f'Importados {self.inserted} de {self.total_rows} registros.'
+        if self.updated:
+            message += f' {self.updated} atualizados.'
+        if self.unchanged:
+            message += f' {self.unchanged} sem alterações.'
+        if self.deleted:
+            message += f' {self.deleted} excluídos.'
+        if self.rejected:
+            message += f' {self.rejected} linhas rejeitadas.'
+        return message
+
+    def to_dict(self):
+        return {
+            'total_rows': self.total_rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'deleted': self.deleted,
+            'rejected': self.rejected,
+            'errors': self.errors,
+        }
+
+
+def _is_blank(series):
+    # Numbers can only be blank as NaN/None; skip the string conversion
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.isna()
+    return series.isna() | series.astype(str).str.strip().eq('')
+
+
+def normalize_headers(df):
+    """Strip the headers and map livros column names to spreadsheet headers."""
+    return df.rename(columns=lambda c: HEADER_FOR_COLUMN.get(str(c).strip(), str(c).strip()))
+
+
+def coerce_frame(df, report):
+    """Convert a raw spreadsheet frame into livros columns with vectorised ops.
+
+    Missing columns and empty cells fall back to '' / 0, like the old
+    row-by-row import did. Rows with non-numeric or negative values in
+    numeric columns, or with every cell empty, are rejected and recorded in
+    the report. Only WRITABLE_COLUMNS are returned.
+    The frame index is the zero-based data row, used to report spreadsheet
+    row numbers. Returns a frame holding only the accepted rows.
+    """
+    df = normalize_headers(df)
+    row_numbers = df.index + FIRST_DATA_ROW
+    out = pd.DataFrame(index=df.index)
+    invalid = pd.Series('', index=df.index)
+    all_blank = pd.Series(True, index=df.index)
+
+    for header, (column, kind) in EXCEL_COLUMNS.items():
+        if column not in WRITABLE_COLUMNS:
+            continue
+        if header not in df.columns:
+            out[column] = '' if kind == 'text' else 0
+            continue
+        raw = df[header]
+        blank = _is_blank(raw)
+        all_blank &= blank
+        if kind == 'text':
+            out[column] = raw.where(~blank, '').astype(str).str.strip()
+            continue
+        numbers = pd.to_numeric(raw, errors='coerce')
+        bad = numbers.isna() & ~blank | np.isinf(numbers)
+        invalid = invalid.where(~bad | invalid.ne(''), f"Valor inválido em '{header}'")
+        negative = numbers.lt(0) & ~bad
+        invalid = invalid.where(~negative | invalid.ne(''), f"Valor negativo em '{header}'")
+        bad |= negative
+        numbers = numbers.where(~(blank | bad), 0)
+        out[column] = np.trunc(numbers).astype('int64') if kind == 'int' else numbers.astype('float64')
+
+    invalid = invalid.where(~all_blank, 'Linha vazia')
+    rejected = invalid.ne('')
+    for position in np.flatnonzero(rejected.to_numpy()):
+        report.reject(int(row_numbers[position]), invalid.iloc[position])
+    return out[~rejected]
+
+
+def frame_rows(frame):
+    """Row tuples of plain Python values, ready for executemany."""
+    columns = [frame[column].tolist() for column in WRITABLE_COLUMNS]
+    return zip(*columns)
+
+
+def name_keys(names):
+    """migrations.nome_key of each name, None for blank ones."""
+    # A plain loop over the same function the database uses is faster than
+    # the equivalent chain of pandas .str methods, and can't disagree with it
+    return pd.Series([nome_key(name) for name in names.tolist()], index=names.index,
+                     dtype=object)
+
+
+def content_hashes(nome, num_livros, valor_cents, livros_faltantes):
+    """64-bit hash of the stored form of each row, as a signed SQLite integer."""
+    frame = pd.DataFrame({
+        'nome': np.asarray(nome, dtype=object),
+        'num_livros': np.asarray(num_livros, dtype=np.int64),
+        'valor_cents': np.asarray(valor_cents, dtype=np.int64),
+        'livros_faltantes': np.asarray(livros_faltantes, dtype=np.int64),
+    })
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def _cents(euros):
+    # round(v * 100) as SQLite does it for the non-negative values accepted
+    return np.floor(euros.to_numpy(dtype=np.float64) * 100 + 0.5).astype(np.int64)
+
+
+class ImportBatch:
+    """What one coerced batch does to livros.
+
+    inserts and updates are value tuples for HASHED_INSERT_SQL and
+    HASHED_UPDATE_SQL, hashes (content_hash, id) pairs for stored rows that
+    were unchanged but had no hash yet, and matched the ids of the stored
+    books named in the batch, rejected rows included.
+    """
+
+    def __init__(self):
+        self.inserts = []
+        self.updates = []
+        self.hashes = []
+        self.matched = np.empty(0, dtype=np.int64)
+
+
+def _reject_rows(frame, rows, report, reason):
+    for position in np.flatnonzero(rows):
+        report.reject(int(frame.index[position]) + FIRST_DATA_ROW, reason)
+
+
+def plan_batch(repository, df, report, mode='append'):
+    """Coerce a raw frame and decide, row by row, what happens to it.
+
+    Names are matched by key (see migrations.nome_key) against the stored
+    books and within the batch. In append mode a name that already exists
+    is rejected and the first of repeated names kept; in upsert mode the
+    stored book is updated unless the content hash is the same, and the
+    last of repeated names wins. Rows seen again in a later batch of the
+    same file simply update the book again.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f'Modo de importação inválido: {mode}')
+    report.total_rows += len(df)
+    batch = ImportBatch()
+    df = normalize_headers(df)
+    frame = coerce_frame(df, report)
+    keys = name_keys(frame['nome'])
+    blank = keys.isna().to_numpy()
+    if mode == 'upsert':
+        _reject_rows(frame, blank, report, 'Nome vazio')
+    repeated = keys.duplicated(keep='last' if mode == 'upsert' else 'first').to_numpy() & ~blank
+    _reject_rows(frame, repeated, report, 'Nome repetido no arquivo')
+
+    # Rows rejected for bad values still name their book, which an import
+    # with delete_missing must then keep
+    lookup = set(keys[~blank].tolist())
+    if 'NOME' in df.columns and len(frame) < len(df):
+        invalid = df['NOME'][~df.index.isin(frame.index)]
+        lookup.update(name_keys(invalid[invalid.notna()]).dropna().tolist())
+    stored = repository.rows_by_key(lookup)
+    batch.matched = np.fromiter((row[0] for row in stored.values()), dtype=np.int64,
+                                count=len(stored))
+
+    dropped = repeated | blank if mode == 'upsert' else repeated
+    frame, keys = frame[~dropped], keys[~dropped]
+    hashes = content_hashes(frame['nome'], frame['num_livros'], _cents(frame['valor_euros']),
+                            frame['livros_faltantes'])
+    existing = [stored.get(key) for key in keys.tolist()]
+    found = np.array([row is not None for row in existing], dtype=bool)
+
+    if mode == 'append':
+        _reject_rows(frame, found, report, 'Já existe um livro com este nome')
+    elif found.any():
+        # (id, content_hash, nome, num_livros, valor_cents, livros_faltantes)
+        rows = [row for row in existing if row is not None]
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        # Books written before migration 5 or outside an import have no
+        # hash yet: hash their stored values, and store it if unchanged
+        unhashed = np.array([row[1] is None for row in rows], dtype=bool)
+        stored_hashes = np.array([row[1] or 0 for row in rows], dtype=np.int64)
+        if unhashed.any():
+            stored_hashes[unhashed] = content_hashes(*zip(*(
+                row[2:] for row, empty in zip(rows, unhashed) if empty)))
+        new_hashes = hashes[found]
+        same = stored_hashes == new_hashes
+        changed = ~same
+        batch.updates = [(*row, int(h), key, int(book_id)) for row, h, key, book_id in zip(
+            frame_rows(frame[found][changed]), new_hashes[changed],
+            keys[found][changed].tolist(), ids[changed])]
+        backfill = same & unhashed
+        batch.hashes = list(zip(stored_hashes[backfill].tolist(), ids[backfill].tolist()))
+        report.updated += len(batch.updates)
+        report.unchanged += int(same.sum())
+
+    new = ~found
+    batch.inserts = [(*row, int(h), key) for row, h, key
+                     in zip(frame_rows(frame[new]), hashes[new], keys[new].tolist())]
+    report.inserted += len(batch.inserts)
+    return batch
+
+
+def write_batch(repository, conn, batch):
+    """Apply a planned batch inside the caller's transaction.
+
+    Plan it in the same repository.write_transaction(): otherwise another
+    import may store one of its names between the lookup and the write.
+    """
+    if batch.inserts:
+        repository.bulk_insert(conn, batch.inserts, HASHED_INSERT_SQL)
+    repository.update_hashed(conn, batch.updates, batch.hashes)
+
+
+def import_frame(repository, df, batch_size=IMPORT_BATCH_SIZE, report=None, mode='append',
+                 matched=None):
+    """Import one DataFrame. The ids of the stored books it names are
+    added to the matched list, if one is given."""
+    report = report or ImportReport()
+    for start in range(0, len(df), batch_size):
+        with repository.write_transaction() as conn:
+            batch = plan_batch(repository, df.iloc[start:start + batch_size], report, mode)
+            write_batch(repository, conn, batch)
+        if matched is not None:
+            matched.extend(batch.matched.tolist())
+    return report
+
+
+def iter_xlsx_frames(source, batch_size):
+    """Yield DataFrames of at most batch_size rows from an .xlsx workbook.
+
+    The workbook is opened in read-only mode, so rows are parsed lazily and
+    memory stays bounded by the batch size. Fully empty rows are skipped,
+    as pd.read_excel does for trailing ones.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(c).strip() if c is not None else '' for c in header]
+        width = len(header)
+        numbered = (
+            (position, row) for position, row in enumerate(rows)
+            if any(value is not None for value in row)
+        )
+        while True:
+            batch = list(islice(numbered, batch_size))
+            if not batch:
+                break
+            index = [position for position, _ in batch]
+            data = [row[:width] + (None,) * (width - len(row)) for _, row in batch]
+            yield pd.DataFrame(data, columns=header, index=index)
+    finally:
+        workbook.close()
+
+
+def iter_csv_frames(source, batch_size):
+    # read_csv keeps a running RangeIndex across chunks, which is the data row
+    yield from pd.read_csv(source, chunksize=batch_size, dtype=str, keep_default_na=False)
+
+
+def _rebatch(batches, batch_size):
+    """Regroup Arrow record batches into tables of batch_size rows."""
+    import pyarrow as pa
+
+    pending, rows = [], 0
+    for batch in batches:
+        offset = 0
+        while offset < batch.num_rows:
+            part = batch.slice(offset, batch_size - rows)
+            pending.append(part)
+            rows += part.num_rows
+            offset += part.num_rows
+            if rows == batch_size:
+                yield pa.Table.from_batches(pending)
+                pending, rows = [], 0
+    if rows:
+        yield pa.Table.from_batches(pending)
+
+
+def _columnar_frames(tables):
+    position = 0
+    for table in tables:
+        frame = table.to_pandas()
+        # No header row in these files: reported rows are 1-based records
+        start = position + 1 - FIRST_DATA_ROW
+        frame.index = pd.RangeIndex(start, start + len(frame))
+        position += len(frame)
+        yield frame
+
+
+def _arrow_source(source):
+    # Uploads are werkzeug FileStorage objects wrapping the real stream
+    return getattr(source, 'stream', source)
+
+
+def iter_parquet_frames(source, batch_size):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(_arrow_source(source))
+    yield from _columnar_frames(_rebatch(parquet.iter_batches(batch_size=batch_size), batch_size))
+
+
+def iter_arrow_frames(source, batch_size):
+    """Arrow IPC in the file format (.arrow/.feather v2) or the stream format."""
+    import pyarrow as pa
+
+    source = _arrow_source(source)
+    if isinstance(source, (str, os.PathLike)):
+        source = pa.memory_map(os.fspath(source))
+    try:
+        reader = pa.ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        source.seek(0)
+        batches = pa.ipc.open_stream(source)
+    yield from _columnar_frames(_rebatch(batches, batch_size))
+
+
+def iter_frames(source, filename, batch_size=IMPORT_BATCH_SIZE):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return iter_csv_frames(source, batch_size)
+    if extension in PARQUET_EXTENSIONS:
+        return iter_parquet_frames(source, batch_size)
+    if extension in ARROW_EXTENSIONS:
+        return iter_arrow_frames(source, batch_size)
+    if extension in STREAMING_EXTENSIONS:
+        return iter_xlsx_frames(source, batch_size)
+    # Legacy .xls files can't be streamed, read them in one go
+    return iter([pd.read_excel(source)])
+
+
+def import_file(repository, source, filename=None, batch_size=IMPORT_BATCH_SIZE,
+                mode='append', delete_missing=False):
+    """Import a workbook, CSV, Parquet or Arrow file (path or file object),
+    one batch at a time.
+
+    Each batch is coerced and written as soon as it is read, so peak memory
+    is bounded by batch_size rather than by the size of the file. mode is
+    'append' or 'upsert' (see plan_batch). With delete_missing, once the
+    whole file has been read, the books it does not name are deleted;
+    books added while the import runs are kept.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f'Modo de importação inválido: {mode}')
+    report = ImportReport()
+    matched = []
+    last_id = repository.last_id() if delete_missing else None
+    started = time.perf_counter()
+    for frame in iter_frames(source, filename or source, batch_size):
+        written, rejected = report.inserted + report.updated, report.rejected
+        import_frame(repository, frame, batch_size, report, mode,
+                     matched if delete_missing else None)
+        # Throughput counters include the time spent reading the batch
+        now = time.perf_counter()
+        metrics.record_import_batch(report.inserted + report.updated - written,
+                                    report.rejected - rejected, now - started)
+        started = now
+    # An empty file is far more likely a mistake than a request to empty livros
+    if delete_missing and report.total_rows:
+        report.deleted = repository.delete_missing(matched, last_id)
+    return report
+
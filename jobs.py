@@ -0,0 +1,412 @@
+import json
+import os
+import socket
+import threading
+import time
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from importer import (ARROW_EXTENSIONS, IMPORT_BATCH_SIZE, IMPORT_MODES, PARQUET_EXTENSIONS,
+                      ImportReport, iter_frames, plan_batch, write_batch)
+
+IMPORT_WORKERS = int(os.environ.get('LIVROS_IMPORT_WORKERS', 2))
+
+# A running job belongs to the process holding its lease, renewed every
+# LEASE_SECONDS / 3; another process only takes it over once it expires
+LEASE_SECONDS = 30
+
+# Job lifecycle: queued -> running -> completed | failed | cancelled
+ACTIVE_STATUSES = ('queued', 'running')
+
+CREATE_JOBS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        path TEXT NOT NULL,
+        batch_size INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        estimated_rows INTEGER,
+        rows_processed INTEGER NOT NULL DEFAULT 0,
+        rows_inserted INTEGER NOT NULL DEFAULT 0,
+        rows_rejected INTEGER NOT NULL DEFAULT 0,
+        errors TEXT NOT NULL DEFAULT '[]',
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        message TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        owner TEXT,
+        lease_until REAL,
+        mode TEXT NOT NULL DEFAULT 'append',
+        delete_missing_up_to INTEGER,
+        rows_updated INTEGER NOT NULL DEFAULT 0,
+        rows_unchanged INTEGER NOT NULL DEFAULT 0,
+        rows_deleted INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+# Columns added since the table was first created, for older databases
+ADDED_COLUMNS = (
+    ('owner', 'TEXT'),
+    ('lease_until', 'REAL'),
+    ('mode', "TEXT NOT NULL DEFAULT 'append'"),
+    ('delete_missing_up_to', 'INTEGER'),
+    ('rows_updated', 'INTEGER NOT NULL DEFAULT 0'),
+    ('rows_unchanged', 'INTEGER NOT NULL DEFAULT 0'),
+    ('rows_deleted', 'INTEGER NOT NULL DEFAULT 0'),
+)
+
+# Ids of the stored books a delete_missing job's file has named so far,
+# written with each batch so a resumed job still knows them
+CREATE_MATCHES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS import_job_matches (
+        job_id TEXT NOT NULL,
+        book_id INTEGER NOT NULL,
+        PRIMARY KEY (job_id, book_id)
+    ) WITHOUT ROWID
+'''
+
+INSERT_MATCHES_SQL = "INSERT OR IGNORE INTO import_job_matches (job_id, book_id) VALUES (?, ?)"
+
+SELECT_MATCHES_SQL = "SELECT book_id FROM import_job_matches WHERE job_id=?"
+
+DELETE_MATCHES_SQL = "DELETE FROM import_job_matches WHERE job_id=?"
+
+# delete_missing_up_to is the last id when the job was queued (NULL without
+# delete_missing): books added while it runs are never deleted
+INSERT_JOB_SQL = '''
+    INSERT INTO import_jobs (id, filename, path, batch_size, status, estimated_rows, created_at,
+                             mode, delete_missing_up_to)
+    VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+'''
+
+SELECT_JOB_SQL = "SELECT * FROM import_jobs WHERE id=?"
+
+SELECT_JOBS_SQL = "SELECT * FROM import_jobs ORDER BY created_at DESC LIMIT ?"
+
+# Claims a queued job, or a running one whose owner stopped renewing its
+# lease; a single UPDATE, so of two processes only one gets it
+START_JOB_SQL = '''
+    UPDATE import_jobs
+    SET status='running', owner=?1, lease_until=?2, started_at=COALESCE(started_at, ?3)
+    WHERE id=?4 AND (status='queued' OR (status='running' AND COALESCE(lease_until, 0) < ?3))
+'''
+
+RENEW_LEASES_SQL = '''
+    UPDATE import_jobs SET lease_until=? WHERE owner=? AND status='running'
+'''
+
+# Runs in the same transaction as the batch insert, so the stored progress
+# always matches what is in livros and a restarted job can resume exactly
+PROGRESS_SQL = '''
+    UPDATE import_jobs
+    SET rows_processed=?, rows_inserted=?, rows_updated=?, rows_unchanged=?, rows_rejected=?,
+        errors=?
+    WHERE id=? AND owner=?
+'''
+
+DELETED_SQL = "UPDATE import_jobs SET rows_deleted=? WHERE id=? AND owner=?"
+
+FINISH_JOB_SQL = '''
+    UPDATE import_jobs SET status=?, message=?, finished_at=? WHERE id=? AND owner=?
+'''
+
+REQUEST_CANCEL_SQL = "UPDATE import_jobs SET cancel_requested=1 WHERE id=?"
+
+# Read at every batch boundary: the cancel may come from another process
+CANCEL_FLAG_SQL = "SELECT cancel_requested FROM import_jobs WHERE id=?"
+
+CANCEL_QUEUED_SQL = '''
+    UPDATE import_jobs SET status='cancelled', finished_at=? WHERE id=? AND status='queued'
+'''
+
+CANCEL_REQUESTED_SQL = '''
+    UPDATE import_jobs SET status='cancelled', finished_at=?
+    WHERE status IN ('queued', 'running') AND cancel_requested=1
+'''
+
+SELECT_ACTIVE_SQL = '''
+    SELECT id FROM import_jobs WHERE status IN ('queued', 'running') ORDER BY created_at
+'''
+
+
+class LeaseLost(Exception):
+    """Another process took the job over; this one must not write to it."""
+
+
+def estimate_rows(path, filename):
+    """Cheap row count used for the ETA, or None when it can't be known."""
+    extension = os.path.splitext(filename)[1].lower()
+    try:
+        if extension == '.csv':
+            with open(path, 'rb') as f:
+                lines = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+            return max(lines - 1, 0)
+        if extension in ('.xlsx', '.xlsm'):
+            from openpyxl import load_workbook
+            workbook = load_workbook(path, read_only=True)
+            try:
+                max_row = workbook.active.max_row
+            finally:
+                workbook.close()
+            return max(max_row - 1, 0) if max_row else None
+        if extension in PARQUET_EXTENSIONS:
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(path).metadata.num_rows
+        if extension in ARROW_EXTENSIONS:
+            import pyarrow as pa
+            reader = pa.ipc.open_file(pa.memory_map(path))
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    except Exception:
+        return None
+    return None
+
+
+class ImportJobManager:
+    """Runs imports on a worker pool, with job state persisted in SQLite."""
+
+    def __init__(self, repository, upload_dir, max_workers=IMPORT_WORKERS, on_change=None):
+        self.repository = repository
+        self.upload_dir = upload_dir
+        self.max_workers = max_workers
+        # Called after every committed batch, e.g. to invalidate read caches
+        self.on_change = on_change
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._executor = None
+        self._heartbeat = None
+        self._retries = {}
+        self._lock = threading.Lock()
+        self._cancelled = set()
+        self._stopping = False
+        self._stopped = threading.Event()
+
+    def init_schema(self):
+        conn = self.repository.connection()
+        with conn:
+            conn.execute(CREATE_JOBS_TABLE_SQL)
+            conn.execute(CREATE_MATCHES_TABLE_SQL)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(import_jobs)')}
+            for name, kind in ADDED_COLUMNS:
+                if name not in columns:
+                    conn.execute(f'ALTER TABLE import_jobs ADD COLUMN {name} {kind}')
+
+    def _submit(self, job_id):
+        with self._lock:
+            if self._stopping:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='import')
+                self._heartbeat = threading.Thread(target=self._renew_leases, daemon=True,
+                                                   name='import-lease')
+                self._heartbeat.start()
+            self._retries.pop(job_id, None)
+            self._executor.submit(self._run, job_id)
+
+    def _retry_later(self, job_id, at):
+        # The job is leased by a live process; try again once the lease
+        # would have expired, in case that process has died by then
+        with self._lock:
+            if self._stopping or job_id in self._retries:
+                return
+            timer = threading.Timer(max(at - time.time(), 0) + 1, self._submit, (job_id,))
+            timer.daemon = True
+            self._retries[job_id] = timer
+        timer.start()
+
+    def _renew_leases(self):
+        while not self._stopped.wait(LEASE_SECONDS / 3):
+            try:
+                conn = self.repository.connection()
+                with conn:
+                    conn.execute(RENEW_LEASES_SQL, (time.time() + LEASE_SECONDS, self.owner))
+            except sqlite3.Error:
+                pass  # busy; the next renewal is well within the lease
+
+    def recover(self):
+        """Requeue jobs left queued or running by a previous process."""
+        conn = self.repository.connection()
+        with conn:
+            conn.execute(CANCEL_REQUESTED_SQL, (time.time(),))
+        rows = conn.execute(SELECT_ACTIVE_SQL).fetchall()
+        for (job_id,) in rows:
+            self._submit(job_id)
+        return len(rows)
+
+    def submit(self, file, filename, batch_size=IMPORT_BATCH_SIZE, mode='append',
+               delete_missing=False):
+        """Save an upload (file object or werkzeug FileStorage) and queue its
+        import; mode and delete_missing are as for importer.import_file."""
+        if mode not in IMPORT_MODES:
+            raise ValueError(f'Modo de importação inválido: {mode}')
+        os.makedirs(self.upload_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.upload_dir, job_id + os.path.splitext(filename)[1].lower())
+        if hasattr(file, 'save'):
+            file.save(path)
+        else:
+            with open(path, 'wb') as out:
+                out.write(file.read())
+
+        conn = self.repository.connection()
+        with conn:
+            conn.execute(INSERT_JOB_SQL, (job_id, filename, path, batch_size,
+                                          estimate_rows(path, filename), time.time(), mode,
+                                          self.repository.last_id() if delete_missing else None))
+        self._submit(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job['status'] not in ACTIVE_STATUSES:
+            return job
+        self._cancelled.add(job_id)
+        conn = self.repository.connection()
+        with conn:
+            conn.execute(REQUEST_CANCEL_SQL, (job_id,))
+            conn.execute(CANCEL_QUEUED_SQL, (time.time(), job_id))
+        return self.get(job_id)
+
+    def _load(self, job_id):
+        cursor = self.repository.connection().execute(SELECT_JOB_SQL, (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cursor.description], row))
+
+    def get(self, job_id):
+        job = self._load(job_id)
+        return _job_to_dict(job) if job else None
+
+    def list(self, limit=50):
+        cursor = self.repository.connection().execute(SELECT_JOBS_SQL, (limit,))
+        names = [c[0] for c in cursor.description]
+        return [_job_to_dict(dict(zip(names, row))) for row in cursor.fetchall()]
+
+    def shutdown(self, wait=True):
+        """Stop the worker pool.
+
+        Running jobs stop at their next batch boundary and stay 'running',
+        so recover() resumes them from the committed progress on restart.
+        """
+        self._stopping = True
+        with self._lock:
+            executor, self._executor = self._executor, None
+            for timer in self._retries.values():
+                timer.cancel()
+            self._retries.clear()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._stopped.set()
+        if executor is not None and wait:
+            # Nothing of ours runs any more: the next process may resume
+            # the jobs right away instead of waiting for the leases to expire
+            conn = self.repository.connection()
+            with conn:
+                conn.execute(RENEW_LEASES_SQL, (0, self.owner))
+
+    def _run(self, job_id):
+        conn = self.repository.connection()
+        now = time.time()
+        with conn:
+            started = conn.execute(START_JOB_SQL, (self.owner, now + LEASE_SECONDS, now,
+                                                   job_id)).rowcount
+        job = self._load(job_id)
+        if not started:
+            if job is not None and job['status'] == 'running':
+                self._retry_later(job_id, job['lease_until'] or now)
+            return
+
+        # Resume from the stored progress, which was committed with the rows
+        report = ImportReport()
+        report.total_rows = job['rows_processed']
+        report.inserted = job['rows_inserted']
+        report.updated = job['rows_updated']
+        report.unchanged = job['rows_unchanged']
+        report.rejected = job['rows_rejected']
+        report.errors = json.loads(job['errors'])
+        skip = job['rows_processed']
+        delete_up_to = job['delete_missing_up_to']
+
+        status, message = 'completed', None
+        cancelled = job['cancel_requested']
+        batch_started = time.perf_counter()
+        try:
+            for frame in iter_frames(job['path'], job['filename'], job['batch_size']):
+                if cancelled or job_id in self._cancelled:
+                    status = 'cancelled'
+                    break
+                if self._stopping:
+                    return
+                if skip >= len(frame):
+                    skip -= len(frame)
+                    continue
+                frame, skip = frame.iloc[skip:], 0
+
+                written, rejected = report.inserted + report.updated, report.rejected
+                with self.repository.write_transaction():
+                    batch = plan_batch(self.repository, frame, report, job['mode'])
+                    write_batch(self.repository, conn, batch)
+                    if delete_up_to is not None:
+                        conn.executemany(INSERT_MATCHES_SQL,
+                                         ((job_id, book_id) for book_id in batch.matched.tolist()))
+                    if not conn.execute(PROGRESS_SQL, (report.total_rows, report.inserted,
+                                                       report.updated, report.unchanged,
+                                                       report.rejected, json.dumps(report.errors),
+                                                       job_id, self.owner)).rowcount:
+                        raise LeaseLost()
+                    cancelled = conn.execute(CANCEL_FLAG_SQL, (job_id,)).fetchone()[0]
+                if self.on_change:
+                    self.on_change()
+                now = time.perf_counter()
+                metrics.record_import_batch(report.inserted + report.updated - written,
+                                            report.rejected - rejected, now - batch_started)
+                batch_started = now
+            # An empty file is far more likely a mistake than a request to
+            # empty livros, as in import_file
+            if status == 'completed' and delete_up_to is not None and report.total_rows:
+                keep = [row[0] for row in conn.execute(SELECT_MATCHES_SQL, (job_id,))]
+                report.deleted = self.repository.delete_missing(keep, delete_up_to)
+                with conn:
+                    conn.execute(DELETED_SQL, (report.deleted, job_id, self.owner))
+            if status == 'completed':
+                message = report.message()
+        except LeaseLost:
+            # Rolled back; the new owner carries on from the committed progress
+            return
+        except Exception as e:
+            status, message = 'failed', f'Erro ao importar arquivo: {str(e)}'
+
+        with conn:
+            finished = conn.execute(FINISH_JOB_SQL, (status, message, time.time(), job_id,
+                                                     self.owner)).rowcount
+            if finished:
+                conn.execute(DELETE_MATCHES_SQL, (job_id,))
+        self._cancelled.discard(job_id)
+        if not finished:
+            return
+        try:
+            os.remove(job['path'])
+        except OSError:
+            pass
+
+
+def _job_to_dict(job):
+    job['errors'] = json.loads(job['errors'])
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    del job['path']
+    del job['owner'], job['lease_until']
+    job['delete_missing'] = job.pop('delete_missing_up_to') is not None
+
+    # Throughput and ETA are derived from the persisted counters
+    end = job['finished_at'] or time.time()
+    elapsed = end - job['started_at'] if job['started_at'] else 0
+    throughput = job['rows_processed'] / elapsed if elapsed > 0 else 0.0
+    eta = None
+    if job['status'] == 'running' and throughput and job['estimated_rows']:
+        eta = max(job['estimated_rows'] - job['rows_processed'], 0) / throughput
+    job['throughput'] = throughput
+    job['eta_seconds'] = eta
+    return job
@@ -0,0 +1,113 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Quiet time after the last keystroke before a query starts
+DEBOUNCE_MS = 250
+
+# How often the Tk loop checks for finished queries while one is running
+POLL_MS = 15
+
+
+class LiveSearch:
+    """Debounced search that runs queries off the Tk main thread.
+
+    run_query(args) is called on a single worker thread, which gets its own
+    pooled SQLite connection from the repository. Results are handed back
+    through a queue drained by root.after(), and on_result(result) runs on
+    the Tk thread. Starting a new search interrupts the query in flight and
+    drops any result that is no longer current.
+    """
+
+    def __init__(self, root, repo, run_query, on_result, on_error=None, on_latency=None,
+                 delay_ms=DEBOUNCE_MS):
+        self.root = root
+        self.repo = repo
+        self.run_query = run_query
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_latency = on_latency
+        self.delay_ms = delay_ms
+        self.generation = 0
+        self.requested_at = None
+        self.last_latency = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search')
+        self._results = queue.Queue()
+        self._pending = None
+        self._polling = False
+        self._running = 0
+        self._conn = None
+
+    def request(self, args, delay_ms=None):
+        """Schedule a search, replacing any search that has not started yet."""
+        self.requested_at = time.perf_counter()
+        if self._pending is not None:
+            self.root.after_cancel(self._pending)
+        delay = self.delay_ms if delay_ms is None else delay_ms
+        self._pending = self.root.after(delay, lambda: self._start(args))
+
+    def cancel(self):
+        if self._pending is not None:
+            self.root.after_cancel(self._pending)
+            self._pending = None
+        self.generation += 1
+        self._interrupt()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _interrupt(self):
+        # Abort the statement the worker is running; harmless when idle
+        if self._running and self._conn is not None:
+            self._conn.interrupt()
+
+    def _start(self, args):
+        self._pending = None
+        self.generation += 1
+        self._interrupt()
+        self._running += 1
+        self._executor.submit(self._work, self.generation, args)
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._poll)
+
+    def _work(self, generation, args):
+        # Superseded while waiting in the queue
+        if generation != self.generation:
+            self._results.put((generation, None, None, 0.0))
+            return
+        self._conn = self.repo.connection()
+        started = time.perf_counter()
+        result = error = None
+        try:
+            result = self.run_query(args)
+        except Exception as e:
+            # Includes sqlite3.OperationalError('interrupted') for stale queries
+            error = e
+        elapsed = (time.perf_counter() - started) * 1000
+        self._results.put((generation, result, error, elapsed))
+
+    def _poll(self):
+        while True:
+            try:
+                generation, result, error, query_ms = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._running -= 1
+            # Only the newest search may touch the UI
+            if generation != self.generation:
+                continue
+            if error is not None:
+                if self.on_error:
+                    self.on_error(error)
+                continue
+            self.on_result(result)
+            self.last_latency = (time.perf_counter() - self.requested_at) * 1000
+            if self.on_latency:
+                self.on_latency(self.last_latency, query_ms)
+
+        if self._running > 0:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
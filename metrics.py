@@ -0,0 +1,364 @@
+"""Built-in instrumentation: Prometheus metrics, SQL timing and cProfile dumps.
+
+Everything is off unless LIVROS_METRICS=1 / LIVROS_PROFILE_DIR are set or
+configure() is called before the first connection is opened. When off,
+connections are plain sqlite3 connections and no request hooks are
+installed, so the only cost left is an enabled() check per import batch.
+"""
+import cProfile
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('livros')
+
+_enabled = os.environ.get('LIVROS_METRICS', '0') == '1'
+_profile_dir = os.environ.get('LIVROS_PROFILE_DIR') or None
+
+# cProfile can only run one profiler at a time on Python 3.12+
+_profile_lock = threading.Lock()
+_profile_seq = 0
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# Label length cap for SQL statements
+MAX_STATEMENT_LABEL = 120
+
+
+def enabled():
+    return _enabled
+
+
+def profile_dir():
+    return _profile_dir
+
+
+def configure(metrics=None, profile=None):
+    """Turn metrics and/or per-action profiling on, e.g. from a --flag."""
+    global _enabled, _profile_dir
+    if metrics is not None:
+        _enabled = metrics
+    if profile:
+        os.makedirs(profile, exist_ok=True)
+        _profile_dir = profile
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge:
+    """Gauge read from a callback returning {label values: value} at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        REGISTRY.append(self)
+
+    def samples(self):
+        if self.collect is None:
+            return
+        for labels, value in self.collect().items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts)) for labels, counts in self._values.items()]
+        for labels, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (self.name + '_bucket',
+                       _format_labels(self.labelnames, labels, [('le', _format_value(bound))]),
+                       cumulative)
+            yield self.name + '_sum', _format_labels(self.labelnames, labels), counts[-1]
+            yield self.name + '_count', _format_labels(self.labelnames, labels), cumulative
+
+
+REGISTRY = []
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'livros_http_request_duration_seconds', 'Latência dos pedidos HTTP por rota',
+    ('method', 'route', 'status'))
+SQL_SECONDS = Histogram(
+    'livros_sql_duration_seconds', 'Tempo de execução de cada instrução SQL', ('statement',))
+SQL_ROWS = Counter(
+    'livros_sql_rows_total', 'Linhas lidas ou alteradas por instrução SQL', ('statement',))
+IMPORT_ROWS = Counter(
+    'livros_import_rows_total', 'Linhas importadas, por resultado', ('result',))
+IMPORT_BATCHES = Counter('livros_import_batches_total', 'Lotes de importação gravados')
+IMPORT_SECONDS = Counter(
+    'livros_import_seconds_total', 'Tempo gasto a ler e gravar lotes de importação')
+DESKTOP_ACTION_SECONDS = Histogram(
+    'livros_desktop_action_duration_seconds', 'Duração das ações do aplicativo desktop',
+    ('action',))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_import_batch(inserted, rejected, seconds):
+    if not _enabled:
+        return
+    IMPORT_ROWS.inc(('inserted',), inserted)
+    IMPORT_ROWS.inc(('rejected',), rejected)
+    IMPORT_BATCHES.inc()
+    IMPORT_SECONDS.inc(amount=seconds)
+
+
+_statement_labels = {}
+
+
+def statement_label(sql):
+    # SQL comes from module constants, so normalising once per string is
+    # enough; IN (?, ?, ...) lists collapse so they share one label
+    label = _statement_labels.get(sql)
+    if label is None:
+        label = ' '.join(sql.split())
+        label = re.sub(r'\?(?:\s*,\s*\?)+', '?, ...', label)[:MAX_STATEMENT_LABEL]
+        _statement_labels[sql] = label
+    return label
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor recording execution time and row counts per statement."""
+
+    _label = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(sql, started)
+
+    def _record(self, sql, started):
+        self._label = statement_label(sql)
+        SQL_SECONDS.observe(time.perf_counter() - started, (self._label,))
+        # rowcount is -1 for queries; their rows are counted as fetched
+        if self.rowcount > 0:
+            SQL_ROWS.inc((self._label,), self.rowcount)
+
+    def _fetched(self, count):
+        if count and self._label is not None:
+            SQL_ROWS.inc((self._label,), count)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._fetched(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._fetched(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._fetched(1)
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods go through TimedCursor."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    return TimedConnection if _enabled else sqlite3.Connection
+
+
+@contextmanager
+def profiled(name):
+    """Write a cProfile dump for the block when profiling is configured."""
+    global _profile_seq
+    if _profile_dir is None or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _profile_seq += 1
+            safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'root'
+            path = os.path.join(_profile_dir,
+                                f'{time.strftime("%Y%m%d-%H%M%S")}-{_profile_seq:04d}-{safe}.prof')
+            profiler.dump_stats(path)
+            logger.info('Perfil gravado em %s', path)
+    finally:
+        _profile_lock.release()
+
+
+def timed_action(name):
+    """Decorator for desktop actions: latency histogram and optional profile."""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if not _enabled and _profile_dir is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                with profiled(name):
+                    return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                if _enabled:
+                    DESKTOP_ACTION_SECONDS.observe(elapsed, (name,))
+                logger.debug('%s: %.1f ms', name, elapsed * 1000)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+def instrument_app(flask_app):
+    """Install request timing and per-request profiling hooks on a Flask app."""
+    if flask_app.extensions.get('livros_metrics') or (not _enabled and _profile_dir is None):
+        return
+    flask_app.extensions['livros_metrics'] = True
+
+    from flask import g, request
+
+    @flask_app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        if _profile_dir is not None:
+            g.metrics_profile = profiled(request.method + request.path)
+            g.metrics_profile.__enter__()
+
+    @flask_app.teardown_request
+    def stop_timer(error=None):
+        profile = g.pop('metrics_profile', None)
+        if profile is not None:
+            profile.__exit__(None, None, None)
+
+    @flask_app.after_request
+    def observe(response):
+        started = g.get('metrics_started')
+        if started is not None and _enabled:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                         (request.method, route, str(response.status_code)))
+        return response
+
+
+class StartupProfile:
+    """Seconds from `started` to each named startup phase (--startup-profile)."""
+
+    def __init__(self, started):
+        self.started = started
+        self.phases = []
+
+    def mark(self, name):
+        self.phases.append((name, time.perf_counter() - self.started))
+
+    def report(self):
+        lines = []
+        previous = 0.0
+        for name, elapsed in self.phases:
+            lines.append(f'{name:<16} {elapsed * 1000:9.1f} ms  (+{(elapsed - previous) * 1000:.1f})')
+            previous = elapsed
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        return {name: elapsed for name, elapsed in self.phases}
@@ -0,0 +1,495 @@
+"""Versioned schema migrations, shared by app.py and book_collection.py.
+
+PRAGMA user_version holds the schema version of a database file. migrate()
+applies every newer migration in order, each in its own BEGIN IMMEDIATE
+transaction, so a database is never left half-upgraded and two processes
+starting at once don't migrate twice.
+
+The SQL here is frozen history: a migration keeps creating exactly what it
+created when it shipped, and later schema changes get a new migration.
+"""
+import logging
+import os
+import sqlite3
+import unicodedata
+
+logger = logging.getLogger('livros')
+
+# Generated columns need SQLite 3.31
+MIN_SQLITE_VERSION = (3, 31, 0)
+
+
+class MigrationError(Exception):
+    pass
+
+
+# Version 1: the schema as created before migrations existed, by the
+# original app.py / book_collection.py plus the summary and FTS additions.
+# Every statement is idempotent so it also adopts those existing files.
+
+V1_CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS livros (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        num_livros INTEGER,
+        valor_euros REAL,
+        livros_faltantes INTEGER,
+        total_livros INTEGER,
+        preco_medio REAL
+    )
+'''
+
+V1_SORT_COLUMNS = ('nome', 'num_livros', 'valor_euros', 'livros_faltantes', 'total_livros',
+                   'preco_medio')
+
+SORT_INDEX = "CREATE INDEX IF NOT EXISTS idx_livros_{0}_id ON livros({0}, id)"
+
+V1_CREATE_SUMMARY = '''
+    CREATE TABLE IF NOT EXISTS livros_summary (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        row_count INTEGER NOT NULL,
+        total_books INTEGER NOT NULL,
+        total_value REAL NOT NULL,
+        missing_books INTEGER NOT NULL,
+        price_sum REAL NOT NULL,
+        price_count INTEGER NOT NULL
+    )
+'''
+
+V1_SEED_SUMMARY = '''
+    INSERT OR REPLACE INTO livros_summary
+    SELECT 1, COUNT(*), COALESCE(SUM(total_livros), 0), COALESCE(SUM(valor_euros), 0),
+           COALESCE(SUM(livros_faltantes), 0), COALESCE(SUM(preco_medio), 0),
+           COUNT(preco_medio)
+    FROM livros
+'''
+
+V1_SUMMARY_DELTA = '''
+    UPDATE livros_summary SET
+        row_count = row_count {op} 1,
+        total_books = total_books {op} COALESCE({row}.total_livros, 0),
+        total_value = total_value {op} COALESCE({row}.valor_euros, 0),
+        missing_books = missing_books {op} COALESCE({row}.livros_faltantes, 0),
+        price_sum = price_sum {op} COALESCE({row}.preco_medio, 0),
+        price_count = price_count {op} ({row}.preco_medio IS NOT NULL)
+    WHERE id = 1;
+'''
+
+SUMMARY_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS livros_summary_insert AFTER INSERT ON livros BEGIN
+        {insert}
+    END;
+    CREATE TRIGGER IF NOT EXISTS livros_summary_delete AFTER DELETE ON livros BEGIN
+        {delete}
+    END;
+    CREATE TRIGGER IF NOT EXISTS livros_summary_update AFTER UPDATE ON livros BEGIN
+        {delete}
+        {insert}
+    END
+'''
+
+CREATE_FTS = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS livros_fts USING fts5(
+        nome,
+        content='livros',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+'''
+
+FTS_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS livros_fts_insert AFTER INSERT ON livros BEGIN
+        INSERT INTO livros_fts(rowid, nome) VALUES (NEW.id, NEW.nome);
+    END;
+    CREATE TRIGGER IF NOT EXISTS livros_fts_delete AFTER DELETE ON livros BEGIN
+        INSERT INTO livros_fts(livros_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+    END;
+    CREATE TRIGGER IF NOT EXISTS livros_fts_update AFTER UPDATE OF nome ON livros BEGIN
+        INSERT INTO livros_fts(livros_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+        INSERT INTO livros_fts(rowid, nome) VALUES (NEW.id, NEW.nome);
+    END
+'''
+
+REBUILD_FTS = "INSERT INTO livros_fts(livros_fts) VALUES ('rebuild')"
+
+
+def _statements(script):
+    # Trigger bodies contain ';', so scripts separate statements with ';\n    CREATE'
+    parts = script.split(';\n    CREATE')
+    return [parts[0]] + ['CREATE' + part for part in parts[1:]]
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def _create_fts(conn, rebuild):
+    # Optional: SQLite built without FTS5 keeps working with LIKE search
+    try:
+        existed = _has_table(conn, 'livros_fts')
+        conn.execute(CREATE_FTS)
+    except sqlite3.OperationalError:
+        return
+    for statement in _statements(FTS_TRIGGERS):
+        conn.execute(statement)
+    if rebuild or not existed:
+        conn.execute(REBUILD_FTS)
+
+
+def baseline(conn):
+    conn.execute(V1_CREATE_TABLE)
+    for column in V1_SORT_COLUMNS:
+        conn.execute(SORT_INDEX.format(column))
+    conn.execute(V1_CREATE_SUMMARY)
+    # Seed from a full scan only when the summary row is new
+    if conn.execute("SELECT 1 FROM livros_summary WHERE id = 1").fetchone() is None:
+        conn.execute(V1_SEED_SUMMARY)
+    delta = {'insert': V1_SUMMARY_DELTA.format(op='+', row='NEW'),
+             'delete': V1_SUMMARY_DELTA.format(op='-', row='OLD')}
+    for statement in _statements(SUMMARY_TRIGGERS.format(**delta)):
+        conn.execute(statement)
+    _create_fts(conn, rebuild=False)
+
+
+# Version 2: derived fields become generated columns, money is stored as
+# integer cents and the stored columns get CHECK constraints. Only nome,
+# the two counts and valor_cents take space in a row now.
+
+V2_CREATE_TABLE = '''
+    CREATE TABLE livros_v2 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        num_livros INTEGER NOT NULL DEFAULT 0 CHECK (num_livros >= 0),
+        livros_faltantes INTEGER NOT NULL DEFAULT 0 CHECK (livros_faltantes >= 0),
+        valor_cents INTEGER NOT NULL DEFAULT 0 CHECK (valor_cents >= 0),
+        valor_euros REAL GENERATED ALWAYS AS (valor_cents / 100.0) VIRTUAL,
+        total_livros INTEGER GENERATED ALWAYS AS (num_livros + livros_faltantes) VIRTUAL,
+        preco_medio REAL GENERATED ALWAYS AS (
+            COALESCE(round(valor_cents / 100.0 / NULLIF(total_livros, 0), 2), 0.0)
+        ) VIRTUAL
+    )
+'''
+
+V2_COPY_ROWS = '''
+    INSERT INTO livros_v2 (id, nome, num_livros, livros_faltantes, valor_cents)
+    SELECT id, nome, COALESCE(num_livros, 0), COALESCE(livros_faltantes, 0),
+           CAST(round(COALESCE(valor_euros, 0) * 100) AS INTEGER)
+    FROM livros
+'''
+
+V2_INVALID_ROWS = '''
+    SELECT id FROM livros
+    WHERE num_livros < 0 OR livros_faltantes < 0 OR valor_euros < 0
+    ORDER BY id LIMIT 20
+'''
+
+V2_CHANGED_TOTALS = '''
+    SELECT COUNT(*) FROM livros
+    WHERE total_livros IS NOT NULL
+      AND total_livros != COALESCE(num_livros, 0) + COALESCE(livros_faltantes, 0)
+'''
+
+V2_CREATE_SUMMARY = '''
+    CREATE TABLE livros_summary (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        row_count INTEGER NOT NULL,
+        total_books INTEGER NOT NULL,
+        total_cents INTEGER NOT NULL,
+        missing_books INTEGER NOT NULL,
+        price_sum REAL NOT NULL,
+        price_count INTEGER NOT NULL
+    )
+'''
+
+V2_SEED_SUMMARY = '''
+    INSERT OR REPLACE INTO livros_summary
+    SELECT 1, COUNT(*), COALESCE(SUM(total_livros), 0), COALESCE(SUM(valor_cents), 0),
+           COALESCE(SUM(livros_faltantes), 0), COALESCE(SUM(preco_medio), 0),
+           COUNT(preco_medio)
+    FROM livros
+'''
+
+V2_SUMMARY_DELTA = '''
+    UPDATE livros_summary SET
+        row_count = row_count {op} 1,
+        total_books = total_books {op} {row}.total_livros,
+        total_cents = total_cents {op} {row}.valor_cents,
+        missing_books = missing_books {op} {row}.livros_faltantes,
+        price_sum = price_sum {op} {row}.preco_medio,
+        price_count = price_count {op} 1
+    WHERE id = 1;
+'''
+
+V2_SORT_COLUMNS = V1_SORT_COLUMNS
+
+
+def normalise(conn):
+    invalid = [row[0] for row in conn.execute(V2_INVALID_ROWS)]
+    if invalid:
+        raise MigrationError('Valores negativos impedem a atualização da base de dados '
+                             f'(ids {", ".join(map(str, invalid))}). Corrija-os e reabra.')
+    changed = conn.execute(V2_CHANGED_TOTALS).fetchone()[0]
+    if changed:
+        logger.warning('%d livros tinham total_livros diferente de num_livros + '
+                       'livros_faltantes; o total passa a ser calculado.', changed)
+
+    # Keep AUTOINCREMENT from handing out ids of rows deleted earlier
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'livros'").fetchone()
+
+    conn.execute(V2_CREATE_TABLE)
+    conn.execute(V2_COPY_ROWS)
+    # Triggers and indexes go with the old table
+    conn.execute("DROP TABLE livros")
+    conn.execute("ALTER TABLE livros_v2 RENAME TO livros")
+    if sequence is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'livros'",
+                     (sequence[0],))
+
+    for column in V2_SORT_COLUMNS:
+        conn.execute(SORT_INDEX.format(column))
+
+    conn.execute("DROP TABLE IF EXISTS livros_summary")
+    conn.execute(V2_CREATE_SUMMARY)
+    conn.execute(V2_SEED_SUMMARY)
+    delta = {'insert': V2_SUMMARY_DELTA.format(op='+', row='NEW'),
+             'delete': V2_SUMMARY_DELTA.format(op='-', row='OLD')}
+    for statement in _statements(SUMMARY_TRIGGERS.format(**delta)):
+        conn.execute(statement)
+
+    if _has_table(conn, 'livros_fts'):
+        _create_fts(conn, rebuild=True)
+
+
+# Version 3: change log for delta sync. Triggers keep one entry per book,
+# re-inserted on every change so its version is the book's latest change;
+# deletes leave a tombstone until compaction drops it. Updates that change
+# nothing are not logged.
+
+V3_CREATE_CHANGES = '''
+    CREATE TABLE livros_changes (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER NOT NULL UNIQUE,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        changed_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+    )
+'''
+
+V3_TOMBSTONE_INDEX = '''
+    CREATE INDEX idx_livros_changes_tombstones ON livros_changes(changed_at) WHERE deleted
+'''
+
+# Highest version whose tombstones may have been compacted away
+V3_CREATE_CHANGES_STATE = '''
+    CREATE TABLE livros_changes_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        purged_through INTEGER NOT NULL
+    )
+'''
+
+V3_SEED_CHANGES = '''
+    INSERT INTO livros_changes (book_id) SELECT id FROM livros ORDER BY id
+'''
+
+V3_LOG_CHANGE = '''
+        DELETE FROM livros_changes WHERE book_id = {row}.id;
+        INSERT INTO livros_changes (book_id, deleted) VALUES ({row}.id, {deleted});
+'''
+
+# Explicit DELETE + INSERT rather than INSERT OR REPLACE, which an outer
+# statement's conflict clause could override
+V3_CHANGE_TRIGGERS = '''
+    CREATE TRIGGER livros_changes_insert AFTER INSERT ON livros BEGIN
+        {insert}
+    END;
+    CREATE TRIGGER livros_changes_delete AFTER DELETE ON livros BEGIN
+        {delete}
+    END;
+    CREATE TRIGGER livros_changes_update AFTER UPDATE ON livros
+    WHEN OLD.id IS NOT NEW.id OR OLD.nome IS NOT NEW.nome
+        OR OLD.num_livros IS NOT NEW.num_livros OR OLD.valor_cents IS NOT NEW.valor_cents
+        OR OLD.livros_faltantes IS NOT NEW.livros_faltantes BEGIN
+        DELETE FROM livros_changes WHERE book_id IN (OLD.id, NEW.id);
+        INSERT INTO livros_changes (book_id, deleted) SELECT OLD.id, 1 WHERE OLD.id IS NOT NEW.id;
+        INSERT INTO livros_changes (book_id, deleted) VALUES (NEW.id, 0);
+    END
+'''
+
+
+def change_log(conn):
+    conn.execute(V3_CREATE_CHANGES)
+    conn.execute(V3_TOMBSTONE_INDEX)
+    conn.execute(V3_CREATE_CHANGES_STATE)
+    conn.execute("INSERT INTO livros_changes_state (id, purged_through) VALUES (1, 0)")
+    conn.execute(V3_SEED_CHANGES)
+    log = {'insert': V3_LOG_CHANGE.format(row='NEW', deleted=0),
+           'delete': V3_LOG_CHANGE.format(row='OLD', deleted=1)}
+    for statement in _statements(V3_CHANGE_TRIGGERS.format(**log)):
+        conn.execute(statement)
+
+
+# Version 4: bulk inserts. While livros_bulk_load has a row, the per-row
+# AFTER INSERT triggers stand aside and BookRepository.bulk_insert updates
+# the summary, the FTS index and the change log with one statement each.
+# The row only ever exists inside the bulk insert's write transaction.
+
+V4_CREATE_BULK_LOAD = '''
+    CREATE TABLE livros_bulk_load (active INTEGER)
+'''
+
+V4_UNLESS_BULK = "WHEN NOT EXISTS (SELECT 1 FROM livros_bulk_load)"
+
+V4_INSERT_TRIGGERS = {
+    'livros_summary_insert': V2_SUMMARY_DELTA.format(op='+', row='NEW'),
+    'livros_fts_insert': "INSERT INTO livros_fts(rowid, nome) VALUES (NEW.id, NEW.nome);",
+    'livros_changes_insert': V3_LOG_CHANGE.format(row='NEW', deleted=0),
+}
+
+
+def bulk_load(conn):
+    conn.execute(V4_CREATE_BULK_LOAD)
+    for name, body in V4_INSERT_TRIGGERS.items():
+        # No FTS table (SQLite without FTS5), no FTS trigger
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                        (name,)).fetchone() is None:
+            continue
+        conn.execute(f"DROP TRIGGER {name}")
+        conn.execute(f"CREATE TRIGGER {name} AFTER INSERT ON livros {V4_UNLESS_BULK} BEGIN\n"
+                     f"        {body}\n    END")
+
+
+# Version 5: upsert imports. nome_key is the normalised name, unique, so
+# a re-imported row finds the book it updates; content_hash is the hash of
+# the writable columns as last written by an upsert import (see importer).
+# Any other write that changes those columns clears it.
+
+def nome_key(nome):
+    """Case-, width- and whitespace-insensitive form of a name; None if blank.
+
+    Also registered as the SQL function nome_key() on every connection.
+    """
+    if nome is None:
+        return None
+    key = ' '.join(unicodedata.normalize('NFKC', str(nome)).casefold().split())
+    return key or None
+
+
+V5_ADD_COLUMNS = (
+    "ALTER TABLE livros ADD COLUMN nome_key TEXT",
+    "ALTER TABLE livros ADD COLUMN content_hash INTEGER",
+)
+
+V5_KEY_INDEX = "CREATE UNIQUE INDEX idx_livros_nome_key ON livros(nome_key)"
+
+V5_RESET_HASH_TRIGGER = '''
+    CREATE TRIGGER livros_content_hash_reset
+    AFTER UPDATE OF nome, num_livros, valor_cents, livros_faltantes ON livros
+    WHEN NEW.content_hash IS OLD.content_hash AND OLD.content_hash IS NOT NULL
+        AND (OLD.nome IS NOT NEW.nome OR OLD.num_livros IS NOT NEW.num_livros
+             OR OLD.valor_cents IS NOT NEW.valor_cents
+             OR OLD.livros_faltantes IS NOT NEW.livros_faltantes) BEGIN
+        UPDATE livros SET content_hash = NULL WHERE id = NEW.id;
+    END
+'''
+
+
+def name_keys(conn):
+    for statement in V5_ADD_COLUMNS:
+        conn.execute(statement)
+    keys, duplicates = [], 0
+    seen = set()
+    for book_id, nome in conn.execute("SELECT id, nome FROM livros ORDER BY id"):
+        key = nome_key(nome)
+        if key in seen:
+            # Earlier appending re-imports left copies; only the oldest
+            # book keeps the key, the others can't be matched by an upsert
+            duplicates += 1
+            continue
+        if key is not None:
+            seen.add(key)
+            keys.append((key, book_id))
+    conn.executemany("UPDATE livros SET nome_key = ? WHERE id = ?", keys)
+    if duplicates:
+        logger.warning('%d livros repetem o nome de um livro anterior e ficam sem chave; '
+                       'uma importação com exclusão dos ausentes remove-os.', duplicates)
+    conn.execute(V5_KEY_INDEX)
+    conn.execute(V5_RESET_HASH_TRIGGER)
+
+
+class Migration:
+    def __init__(self, version, description, apply, rewrites=False):
+        self.version = version
+        self.description = description
+        self.apply = apply
+        # Rewrites existing rows: back the file up first and VACUUM after
+        self.rewrites = rewrites
+
+
+MIGRATIONS = (
+    Migration(1, 'esquema inicial com resumo e pesquisa de texto', baseline),
+    Migration(2, 'colunas geradas, cêntimos e restrições CHECK', normalise, rewrites=True),
+    Migration(3, 'registro de alterações para sincronização', change_log),
+    Migration(4, 'inserção em massa sem gatilhos por linha', bulk_load),
+    Migration(5, 'chave de nome única e hash de conteúdo', name_keys),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _backup(conn, db_path, version):
+    if not db_path or db_path == ':memory:' or db_path.startswith('file:'):
+        return None
+    if not _has_table(conn, 'livros') or \
+            conn.execute("SELECT 1 FROM livros LIMIT 1").fetchone() is None:
+        return None
+    path = f'{db_path}.v{version}.bak'
+    if not os.path.exists(path):
+        conn.execute("VACUUM INTO ?", (path,))
+        logger.info('Cópia de segurança da versão %d gravada em %s', version, path)
+    return path
+
+
+def migrate(conn, db_path=None):
+    """Bring the database to LATEST_VERSION; returns the versions applied."""
+    current = schema_version(conn)
+    if current > LATEST_VERSION:
+        raise MigrationError(f'A base de dados está na versão {current}, mais recente do que '
+                             f'esta aplicação suporta ({LATEST_VERSION}).')
+    pending = [m for m in MIGRATIONS if m.version > current]
+    if not pending:
+        return []
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise MigrationError(f'SQLite {sqlite3.sqlite_version} é antigo demais; '
+                             'é preciso a versão 3.31 ou mais recente.')
+
+    applied = []
+    rewrote = False
+    for migration in pending:
+        if migration.rewrites and current > 0:
+            _backup(conn, db_path, current)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            current = schema_version(conn)
+            if current >= migration.version:
+                conn.execute("COMMIT")
+                continue
+            migration.apply(conn)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info('Base de dados atualizada para a versão %d: %s',
+                    migration.version, migration.description)
+        current = migration.version
+        applied.append(migration.version)
+        rewrote = rewrote or migration.rewrites
+    # Give the pages of rewritten tables back to the file system
+    if rewrote:
+        conn.execute("VACUUM")
+    return applied
@@ -0,0 +1,110 @@
+"""Collections: one SQLite file per collection, shared by app.py and book_collection.py.
+
+The default collection, livros, is the file given by LIVROS_DB (livros.db);
+every other one is <name>.db in LIVROS_COLLECTIONS_DIR. Creating a
+collection creates and migrates its file, so any process sees it on its
+next lookup.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import BookRepository, ConnectionPool, get_db_path
+
+DEFAULT_COLLECTION = 'livros'
+COLLECTIONS_DIR = os.environ.get('LIVROS_COLLECTIONS_DIR', 'colecoes')
+COLLECTION_EXTENSION = '.db'
+
+# Names double as file names and URL segments
+NAME_PATTERN = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+
+# Taken by the cross-collection routes under /api/collections
+RESERVED_NAMES = ('search', 'summary')
+
+# Threads for queries that fan out across collections. sqlite3 releases the
+# GIL while a statement runs, so queries on different files run in parallel.
+FANOUT_WORKERS = int(os.environ.get('LIVROS_FANOUT_WORKERS', min(8, os.cpu_count() or 1)))
+
+
+def valid_name(name):
+    return bool(NAME_PATTERN.fullmatch(name or '')) and name not in RESERVED_NAMES
+
+
+class CollectionRegistry:
+    """Finds and creates collection files."""
+
+    def __init__(self, default_path=None, directory=None):
+        self.default_path = default_path or get_db_path()
+        self.directory = directory or COLLECTIONS_DIR
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + COLLECTION_EXTENSION)
+
+    def paths(self):
+        """{name: db_path}, the default collection first and then by name."""
+        paths = {DEFAULT_COLLECTION: self.default_path}
+        try:
+            entries = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            name, extension = os.path.splitext(entry)
+            if extension == COLLECTION_EXTENSION and valid_name(name) and name not in paths:
+                paths[name] = os.path.join(self.directory, entry)
+        return paths
+
+    def names(self):
+        return list(self.paths())
+
+    def path(self, name):
+        """db_path of an existing collection, or None."""
+        if name == DEFAULT_COLLECTION:
+            return self.default_path
+        if not valid_name(name):
+            return None
+        path = self._path(name)
+        return path if os.path.exists(path) else None
+
+    def create(self, name):
+        """Create an empty, migrated collection. Raises ValueError for an
+        invalid name and FileExistsError if it already exists."""
+        if name == DEFAULT_COLLECTION:
+            raise FileExistsError(name)
+        if not valid_name(name):
+            raise ValueError('Nome de coleção inválido: use letras minúsculas, números, - e _')
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(name)
+        # O_EXCL: of two concurrent creations only one succeeds
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        repository = BookRepository(ConnectionPool(path))
+        try:
+            repository.init_schema()
+        finally:
+            repository.pool.close_all()
+        return path
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def fan_out(func, items):
+    """[(item, result, error)] for func(item) on every item, run on a shared
+    thread pool; error is the exception raised, if any, and result None."""
+    global _executor
+    items = list(items)
+    if len(items) <= 1:
+        return [_call(func, item) for item in items]
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS,
+                                           thread_name_prefix='fanout')
+    return list(_executor.map(lambda item: _call(func, item), items))
+
+
+def _call(func, item):
+    try:
+        return item, func(item), None
+    except Exception as e:
+        return item, None, e
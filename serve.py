@@ -0,0 +1,66 @@
+"""Production server for the REST API.
+
+Usage: python serve.py [--host H] [--port N] [--workers N] [--threads N]
+                       [--graceful-timeout S] [--metrics] [--profile DIR]
+
+Serves asgi.application with uvicorn (pip install uvicorn). Every worker is a
+separate process with its own SQLite connection pool and request thread
+pool; SIGINT / SIGTERM stop accepting connections, wait for open requests
+and let running imports pause at a batch boundary.
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de produção da API de livros')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('LIVROS_WORKERS', 1)),
+                        help='processos (padrão: LIVROS_WORKERS ou 1)')
+    parser.add_argument('--threads', type=int,
+                        default=int(os.environ.get('LIVROS_DB_THREADS', 8)),
+                        help='threads de SQLite por processo (padrão: LIVROS_DB_THREADS ou 8)')
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help='segundos de espera por pedidos abertos ao encerrar')
+    parser.add_argument('--metrics', action='store_true',
+                        help='mede rotas, SQL e importações (exposto em /metrics)')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='grava um perfil cProfile por pedido neste diretório')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('uvicorn não está instalado: pip install uvicorn')
+
+    # Read by asgi.py / metrics.py in every worker
+    os.environ['LIVROS_DB_THREADS'] = str(max(1, args.threads))
+    if args.metrics:
+        os.environ['LIVROS_METRICS'] = '1'
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+        os.environ['LIVROS_PROFILE_DIR'] = os.path.abspath(args.profile)
+
+    api = None
+    if args.workers > 1:
+        # Only one process may resume interrupted imports, so this one does
+        # it and the workers skip it
+        import app as api
+        api.init_db(recover=True)
+        os.environ['LIVROS_RECOVER_IMPORTS'] = '0'
+
+    try:
+        uvicorn.run('asgi:application', host=args.host, port=args.port,
+                    workers=max(1, args.workers), app_dir=BASE_DIR, lifespan='on',
+                    timeout_graceful_shutdown=args.graceful_timeout)
+    finally:
+        if api is not None:
+            api.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Collection statistics computed with NumPy/pandas over a columnar snapshot.
+
+The snapshot is one read of livros into arrays. When the database's data
+version changes it is brought up to date from the change log, or read
+again after large changes; every report is vectorised work on those
+arrays and never touches SQLite.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from database import ChangesExpired
+
+SNAPSHOT_SQL = '''
+    SELECT id, nome, num_livros, livros_faltantes, total_livros, valor_cents, preco_medio
+    FROM livros
+'''
+
+# More changes than this since the snapshot and it is read again in full
+DELTA_LIMIT = 10000
+
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+DEFAULT_BINS = 20
+MAX_BINS = 200
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+# Completion bands over livros_faltantes / total_livros
+COMPLETION_EDGES = (0.0, 1e-12, 0.25, 0.5, 0.75, 1.0)
+COMPLETION_LABELS = ('complete', 'missing <=25%', 'missing 25-50%', 'missing 50-75%',
+                     'missing >75%')
+
+# Collections with more volumes than the last edge share the last band
+SIZE_EDGES = (0, 1, 5, 10, 25, 50, 100)
+
+
+def _frame(ids, names, counts, missing, totals, cents, prices):
+    frame = pd.DataFrame({
+        'id': np.array(ids, dtype=np.int64),
+        'nome': np.array(names, dtype=object),
+        'num_livros': np.array(counts, dtype=np.int64),
+        'livros_faltantes': np.array(missing, dtype=np.int64),
+        'total_livros': np.array(totals, dtype=np.int64),
+        'valor_euros': np.array(cents, dtype=np.int64) / 100.0,
+        'preco_medio': np.array(prices, dtype=np.float64),
+    })
+    frame.index = frame['id'].to_numpy()
+    total = frame['total_livros'].to_numpy()
+    # Share of the collection still missing; NaN for empty collections
+    frame['missing_ratio'] = np.divide(
+        frame['livros_faltantes'].to_numpy(), total,
+        out=np.full(len(frame), np.nan), where=total > 0)
+    return frame
+
+
+class Snapshot:
+    """livros as a DataFrame of NumPy columns, indexed by id.
+
+    token is the data version it was read at, version the change-log
+    version (see /api/books/changes) it includes.
+    """
+
+    def __init__(self, frame, token, version):
+        self.frame = frame
+        self.token = token
+        self.version = version
+
+    @classmethod
+    def load(cls, repo, token):
+        # Read before the rows: later changes get applied again, harmlessly
+        version = repo.changes_version()
+        rows = repo.connection().execute(SNAPSHOT_SQL).fetchall()
+        return cls(_frame(*(zip(*rows) if rows else ([],) * 7)), token, version)
+
+    def updated(self, repo, token):
+        """A new Snapshot with the logged changes applied, or None when a
+        full reload is needed (too many changes, or the log was compacted)."""
+        try:
+            changes, version, has_more = repo.changes_since(self.version, DELTA_LIMIT)
+        except ChangesExpired:
+            return None
+        if has_more:
+            return None
+        if not changes:
+            return Snapshot(self.frame, token, version)
+
+        changed = np.array([book_id for _, book_id, _ in changes], dtype=np.int64)
+        # (id, nome, num_livros, valor_euros, livros_faltantes, total_livros, preco_medio)
+        books = [book for _, _, book in changes if book is not None]
+        kept = self.frame[~self.frame.index.isin(changed)]
+        if books:
+            ids, names, counts, values, missing, totals, prices = zip(*books)
+            cents = np.round(np.array(values, dtype=np.float64) * 100)
+            kept = pd.concat([kept, _frame(ids, names, counts, missing, totals, cents, prices)])
+        return Snapshot(kept, token, version)
+
+
+class StatsSnapshot:
+    """Holds the current Snapshot and refreshes it when the data changes."""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.updates = 0
+
+    def get(self, repo):
+        token = (id(repo), repo.data_version())
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.token == token:
+            return snapshot
+        # One request refreshes, concurrent ones wait for it
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.token == token:
+                return snapshot
+            refreshed = None
+            if snapshot is not None and snapshot.token[0] == token[0]:
+                refreshed = snapshot.updated(repo, token)
+            if refreshed is None:
+                refreshed = Snapshot.load(repo, token)
+                self.loads += 1
+            else:
+                self.updates += 1
+            self._snapshot = refreshed
+        return refreshed
+
+
+def _histogram(values, bins):
+    values = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+    if len(values) == 0:
+        return {'edges': [], 'counts': []}
+    counts, edges = np.histogram(values, bins=bins)
+    return {'edges': np.round(edges, 4).tolist(), 'counts': counts.tolist()}
+
+
+def _percentiles(values):
+    values = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+    if len(values) == 0:
+        return {f'p{p}': None for p in PERCENTILES}
+    return {f'p{p}': float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _top(frame, n):
+    values = frame['valor_euros'].to_numpy()
+    n = min(n, len(values))
+    if n == 0:
+        return []
+    # Partial selection of the n-th largest value, then sort only the rows
+    # at or above it; ties are broken by id whatever the frame's order
+    threshold = -np.partition(-values, n - 1)[n - 1]
+    index = np.flatnonzero(values >= threshold)
+    index = index[np.lexsort((frame['id'].to_numpy()[index], -values[index]))][:n]
+    top = frame.iloc[index]
+    return [
+        {'id': int(row.id), 'nome': row.nome, 'valor_euros': float(row.valor_euros),
+         'total_livros': int(row.total_livros), 'preco_medio': float(row.preco_medio)}
+        for row in top.itertuples(index=False)
+    ]
+
+
+def _group(frame, keys):
+    grouped = frame.groupby(keys, observed=False, sort=True).agg(
+        collections=('id', 'size'),
+        total_livros=('total_livros', 'sum'),
+        livros_faltantes=('livros_faltantes', 'sum'),
+        valor_euros=('valor_euros', 'sum'),
+        preco_medio=('preco_medio', 'mean'),
+    )
+    return [
+        {'group': str(label), 'collections': int(row.collections),
+         'total_livros': int(row.total_livros), 'livros_faltantes': int(row.livros_faltantes),
+         'valor_euros': round(float(row.valor_euros), 2),
+         'preco_medio': None if np.isnan(row.preco_medio) else round(float(row.preco_medio), 2)}
+        for label, row in zip(grouped.index, grouped.itertuples(index=False))
+    ]
+
+
+def completion_bands(frame):
+    return pd.cut(frame['missing_ratio'], bins=list(COMPLETION_EDGES), labels=COMPLETION_LABELS,
+                  include_lowest=True, right=True)
+
+
+def size_bands(frame):
+    edges = list(SIZE_EDGES) + [np.inf]
+    labels = [f'{low}-{high - 1}' if high - low > 1 else str(low)
+              for low, high in zip(SIZE_EDGES, SIZE_EDGES[1:])] + [f'{SIZE_EDGES[-1]}+']
+    return pd.cut(frame['total_livros'], bins=edges, labels=labels, right=False)
+
+
+GROUP_BY = {
+    'completion': completion_bands,
+    'size': size_bands,
+}
+
+
+def collection_stats(snapshot, bins=DEFAULT_BINS, top=DEFAULT_TOP, group_by=('completion',)):
+    """The /api/stats report for one snapshot."""
+    frame = snapshot.frame
+    ratio = frame['missing_ratio'].to_numpy()
+    known = ratio[~np.isnan(ratio)]
+    return {
+        'collections': len(frame),
+        'total_books': int(frame['total_livros'].sum()),
+        'missing_books': int(frame['livros_faltantes'].sum()),
+        'total_value': round(float(frame['valor_euros'].sum()), 2),
+        'histograms': {
+            'preco_medio': _histogram(frame['preco_medio'].to_numpy(), bins),
+            'valor_euros': _histogram(frame['valor_euros'].to_numpy(), bins),
+            'missing_ratio': _histogram(known, np.linspace(0.0, 1.0, bins + 1)),
+        },
+        'percentiles': {
+            column: _percentiles(frame[column].to_numpy())
+            for column in ('valor_euros', 'preco_medio', 'total_livros', 'missing_ratio')
+        },
+        'completion': {
+            'complete': int((known == 0).sum()),
+            'incomplete': int((known > 0).sum()),
+            'empty': int(len(ratio) - len(known)),
+            'mean_missing_ratio': float(known.mean()) if len(known) else None,
+        },
+        'top_by_value': _top(frame, top),
+        'groups': {name: _group(frame, GROUP_BY[name](frame)) for name in group_by},
+    }
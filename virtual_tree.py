@@ -0,0 +1,340 @@
+import copy
+from collections import OrderedDict
+
+from database import BOOK_COLUMNS, row_matches
+
+# Rows fetched per SQLite query and pages kept in memory by a QuerySource;
+# together they bound memory to PAGE_SIZE * MAX_CACHED_PAGES rows whatever
+# the table size
+PAGE_SIZE = 100
+MAX_CACHED_PAGES = 6
+
+DEFAULT_ROW_HEIGHT = 20
+DEFAULT_HEADER_HEIGHT = 25
+
+
+def flip_order(order):
+    return [(column, not descending) for column, descending in order]
+
+
+class _PageCache:
+    """Pages of rows in a source's base order, shared with its reversal."""
+
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        # Sort key of the first and last row of every page read so far, so
+        # a neighbouring page can start with an index seek instead of OFFSET
+        self.starts = {}
+        self.ends = {}
+
+    def clear(self):
+        self.pages.clear()
+        self.starts.clear()
+        self.ends.clear()
+
+    def get(self, index):
+        if index in self.pages:
+            self.pages.move_to_end(index)
+            return self.pages[index]
+        return None
+
+    def put(self, index, rows):
+        self.pages[index] = rows
+        if len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+
+class QuerySource:
+    """Rows of livros matching filters, read from SQLite one page at a time.
+
+    order is a list of (column, descending) pairs applied with ORDER BY on
+    the indexed columns. name limits the rows to a full-text name search,
+    in relevance order when order is empty. Pages are cached in the base
+    order; reversed() returns a view over the same cache, so flipping the
+    direction maps positions instead of sorting again.
+    """
+
+    def __init__(self, repo, filters=None, order=(('id', False),), name=None,
+                 page_size=PAGE_SIZE, max_cached_pages=MAX_CACHED_PAGES):
+        self.repo = repo
+        self.filters = filters
+        self.name = name
+        self.base_order = list(order)
+        self.flipped = False
+        self.page_size = page_size
+        self._cache = _PageCache(max_cached_pages)
+        self._sort_indexes = [BOOK_COLUMNS.index(column) for column, _ in order]
+
+    @property
+    def order(self):
+        return flip_order(self.base_order) if self.flipped else self.base_order
+
+    def reversed(self):
+        view = copy.copy(self)
+        view.flipped = not self.flipped
+        return view
+
+    def count(self):
+        return self.repo.count_books(self.filters, self.name)
+
+    def matches(self, row):
+        if self.name is not None and not self.repo.name_matches(self.name, row[1]):
+            return False
+        return row_matches(self.filters, row)
+
+    def sort_key(self, row):
+        return tuple(row[index] for index in self._sort_indexes)
+
+    def invalidate(self):
+        # Positions shifted, every cached page and boundary is stale
+        self._cache.clear()
+
+    def patch(self, row):
+        for rows in self._cache.pages.values():
+            for index, cached in enumerate(rows):
+                if cached[0] == row[0]:
+                    rows[index] = row
+
+    def window(self, offset, count, total):
+        if self.flipped:
+            # Position p counted from the end is base position total - 1 - p
+            start = max(total - offset - count, 0)
+            return self._base_window(start, total - offset - start)[::-1]
+        return self._base_window(offset, count)
+
+    def _base_window(self, offset, count):
+        if count <= 0:
+            return []
+        first_page = offset // self.page_size
+        last_page = (offset + count - 1) // self.page_size
+        rows = []
+        for index in range(first_page, last_page + 1):
+            rows.extend(self._page(index))
+        start = offset - first_page * self.page_size
+        return rows[start:start + count]
+
+    def _key(self, row):
+        return (row[self._sort_indexes[0]], row[0])
+
+    def _page(self, index):
+        cache = self._cache
+        rows = cache.get(index)
+        if rows is not None:
+            return rows
+
+        size = self.page_size
+        keyset = len(self.base_order) == 1
+        if keyset and index - 1 in cache.ends:
+            rows = self.repo.fetch_window(size, order=self.base_order, filters=self.filters,
+                                          after=cache.ends[index - 1], name=self.name)
+        elif keyset and index + 1 in cache.starts:
+            # Walking backwards: seek before the next page in reverse order
+            rows = self.repo.fetch_window(size, order=flip_order(self.base_order),
+                                          filters=self.filters,
+                                          after=cache.starts[index + 1], name=self.name)[::-1]
+        else:
+            rows = self.repo.fetch_window(size, index * size, self.base_order, self.filters,
+                                          name=self.name)
+
+        if rows and keyset:
+            cache.starts[index] = self._key(rows[0])
+            cache.ends[index] = self._key(rows[-1])
+        cache.put(index, rows)
+        return rows
+
+
+class VirtualTreeview:
+    """Windowed view over a row source for a ttk.Treeview.
+
+    Only the rows that fit in the widget exist as Treeview items (iid is
+    the livros id); the scrollbar is driven by the row offset and rows
+    are asked from the source on demand as the user scrolls.
+    """
+
+    def __init__(self, tree, scrollbar):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        # Set with set_source(); nothing is shown until then
+        self.source = None
+        self.total = 0
+        self.offset = 0
+        self.selected_id = None
+        self._row_height = None
+        self._header_height = None
+        # iid -> values currently shown, to skip redundant Treeview updates
+        self._shown = {}
+
+        scrollbar.configure(command=self.yview)
+        tree.bind("<Configure>", lambda event: self.render())
+        tree.bind("<MouseWheel>", self._on_mousewheel)
+        tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        tree.bind("<Button-5>", lambda event: self.scroll(3))
+        tree.bind("<Up>", lambda event: self._on_arrow(-1))
+        tree.bind("<Down>", lambda event: self._on_arrow(1))
+        tree.bind("<Prior>", lambda event: self.scroll(-self.visible_rows()))
+        tree.bind("<Next>", lambda event: self.scroll(self.visible_rows()))
+
+    def set_source(self, source, total=None):
+        """Show a new source; a known row count avoids counting again here."""
+        self.source = source
+        self.offset = 0
+        if total is None:
+            self.refresh()
+        else:
+            self.total = total
+            self.render()
+
+    def reverse(self):
+        """Flip the current order; cached rows are reused, nothing is re-sorted."""
+        self.source = self.source.reversed()
+        self.offset = 0
+        self.render()
+
+    def refresh(self):
+        """Re-read the row count and the visible rows, keeping the scroll position."""
+        self.source.invalidate()
+        self.total = self.source.count()
+        self.render()
+
+    def visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            # Not mapped yet, fall back to the configured height in rows
+            return int(self.tree.cget("height"))
+        self._measure()
+        row_height = self._row_height or DEFAULT_ROW_HEIGHT
+        header_height = self._header_height or DEFAULT_HEADER_HEIGHT
+        return max(1, (height - header_height) // row_height)
+
+    def _measure(self):
+        if self._row_height is not None:
+            return
+        children = self.tree.get_children()
+        bbox = self.tree.bbox(children[0]) if children else None
+        if bbox:
+            self._header_height, self._row_height = bbox[1], bbox[3]
+
+    def render(self):
+        count = self.visible_rows()
+        self.offset = max(0, min(self.offset, self.total - count))
+        rows = self.source.window(self.offset, count, self.total) if self.total else []
+
+        self._apply_window(rows)
+
+        selected = str(self.selected_id)
+        if (self.selected_id is not None and self.tree.exists(selected)
+                and selected not in self.tree.selection()):
+            self.tree.selection_set(selected)
+
+        if self.total:
+            self.scrollbar.set(self.offset / self.total, (self.offset + len(rows)) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _apply_window(self, rows):
+        # Diff against the items on screen so that scrolling by one row or
+        # editing one book costs a single Treeview insert/delete/update
+        ids = [str(row[0]) for row in rows]
+        wanted = set(ids)
+        current = list(self.tree.get_children())
+        stale = [iid for iid in current if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            current = [iid for iid in current if iid in wanted]
+
+        for position, (iid, row) in enumerate(zip(ids, rows)):
+            row = tuple(row)
+            if position < len(current) and current[position] == iid:
+                if self._shown.get(iid) != row:
+                    self.tree.item(iid, values=row)
+                continue
+            if iid in current:
+                self.tree.move(iid, "", position)
+                current.remove(iid)
+                if self._shown.get(iid) != row:
+                    self.tree.item(iid, values=row)
+            else:
+                self.tree.insert("", position, iid=iid, values=row)
+            current.insert(position, iid)
+        self._shown = dict(zip(ids, map(tuple, rows)))
+
+    def _changed(self):
+        # Rows moved in the source: drop cached pages and redraw the window
+        self.source.invalidate()
+        self.render()
+
+    def in_view(self, row):
+        """Whether a row, as it is stored now, is part of the current view."""
+        return self.source.matches(row)
+
+    def apply_insert(self, row):
+        """Show a newly added book if it belongs to the current view."""
+        if not self.source.matches(row):
+            return False
+        self.total += 1
+        self._changed()
+        return True
+
+    def apply_update(self, old_row, row):
+        """Reflect an edited book, keeping the current filter and sort order."""
+        was_shown = self.in_view(old_row)
+        is_shown = self.source.matches(row)
+        if not was_shown:
+            return self.apply_insert(row)
+        if not is_shown:
+            return self.apply_delete(row[0])
+
+        if self.source.sort_key(old_row) == self.source.sort_key(row):
+            # Same position: patch the cached copy and the item in place
+            self.source.patch(row)
+            iid = str(row[0])
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=row)
+                self._shown[iid] = tuple(row)
+            return True
+
+        self._changed()
+        return True
+
+    def apply_delete(self, book_id):
+        """Drop a deleted book from the view."""
+        self.total = max(self.total - 1, 0)
+        if self.selected_id == book_id:
+            self.selected_id = None
+        self._changed()
+        return True
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.render()
+        return "break"
+
+    def yview(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"|"pages")
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * self.total)
+            self.render()
+        elif args[0] == "scroll":
+            step = self.visible_rows() if args[2] == "pages" else 1
+            self.scroll(int(args[1]) * step)
+
+    def _on_mousewheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_arrow(self, step):
+        # Let Tk move the selection inside the window, scroll at its edges
+        children = self.tree.get_children()
+        focus = self.tree.focus()
+        if not children or focus not in children:
+            return None
+        position = children.index(focus) + step
+        if 0 <= position < len(children):
+            return None
+        self.scroll(step)
+        children = self.tree.get_children()
+        if children:
+            edge = children[0] if step < 0 else children[-1]
+            self.tree.focus(edge)
+            self.tree.selection_set(edge)
+        return "break"